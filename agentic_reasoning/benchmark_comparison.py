@@ -0,0 +1,103 @@
+"""
+Benchmark for comparison questions.
+
+Runs the retrieval part of the graph (planner -> parallel manual_retriever branches -> join)
+for comparisons over 2, 3 and 4 manuals and compares it with running the same sub-queries
+one after another and with a plain single-manual question. The parallel fan-out should
+take about as long as a single retrieval. Only manuals that have chunks in the store are
+compared (a manual without chunks returns before searching), larger counts are skipped.
+
+usage: python agentic_reasoning/benchmark_comparison.py [--runs 5]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from agentic_reasoning.multi_agent_pipeline import (
+    KNOWN_MANUALS,
+    build_workflow,
+    get_db,
+    manual_retriever_agent,
+    planner_agent,
+)
+
+
+
+def comparison_question(manuals):
+    return f"Compare the milk system cleaning procedures of the {' and '.join(manuals)}."
+
+
+def run_sequential(question):
+    #baseline: every sub-query searched one after another
+    plan = planner_agent({"question": question})
+    for sub_query in plan["sub_queries"]:
+        manual_retriever_agent({"question": question, "sub_query": sub_query})
+
+
+async def run_parallel(app, question):
+    await app.ainvoke({"question": question})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel sub-query retrieval")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per manual count")
+    args = parser.parse_args()
+
+    #load the store and embedding model up front so they are not part of the timings
+    db = get_db()
+    app = build_workflow(synthesize=False).compile()
+
+    manuals = [manual for manual in KNOWN_MANUALS if len(db.manual_ids([manual]))]
+    skipped = list(range(max(len(manuals) + 1, 2), len(KNOWN_MANUALS) + 1))
+    print(f"Manuals in the store: {manuals}")
+    if skipped:
+        print(f"Skipping comparisons over {skipped} manuals, the store doesn't have that many")
+    if len(manuals) < 2:
+        print("Need at least two manuals in the store to benchmark comparisons.")
+        return
+
+    #warm up both paths once
+    warmup = comparison_question(manuals[:2])
+    run_sequential(warmup)
+    asyncio.run(run_parallel(app, warmup))
+
+    #reference point: the same graph answering a plain single-manual question
+    single_times = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        asyncio.run(run_parallel(app, f"How do I clean the milk system of the {manuals[0]}?"))
+        single_times.append(time.perf_counter() - start)
+    single = statistics.median(single_times)
+
+    rows = []
+    for n in range(2, len(manuals) + 1):
+        question = comparison_question(manuals[:n])
+
+        sequential_times = []
+        parallel_times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run_sequential(question)
+            sequential_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            asyncio.run(run_parallel(app, question))
+            parallel_times.append(time.perf_counter() - start)
+
+        rows.append((n, statistics.median(sequential_times), statistics.median(parallel_times)))
+
+    print(f"\nsingle retrieval through the graph: {single * 1000:.1f} ms")
+    print("manuals | sequential (ms) | parallel (ms) | parallel / single")
+    for n, sequential, parallel in rows:
+        print(f"{n:7d} | {sequential * 1000:15.1f} | {parallel * 1000:13.1f} | {parallel / single:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Synthetic load test for the LLM scheduler, with a mock LLM (no API key needed).
+
+The mock LLM behaves like a rate limited provider: up to --provider-limit calls run at
+normal speed, above that every call slows down with the number of calls in flight.
+A burst of interactive (/stream) and batch (/ask) requests is sent once straight to the
+mock (no limit, how it worked before) and once through the LLMScheduler.
+
+usage: python agentic_reasoning/benchmark_llm_scheduler.py [--requests 300] [--burst-seconds 2]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from agentic_reasoning.llm_scheduler import LLMScheduler, SchedulerRejected, INTERACTIVE, BATCH
+
+
+class MockLLM:
+    """Fake LLM backend that gets slower when too many calls are in flight"""
+    def __init__(self, latency=0.3, provider_limit=4):
+        self.latency = latency
+        self.provider_limit = provider_limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def call(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            slowdown = max(1.0, self.in_flight / self.provider_limit)
+            await asyncio.sleep(self.latency * slowdown)
+        finally:
+            self.in_flight -= 1
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run_load(requests, burst_seconds, interactive_share, llm, scheduler=None, seed=0):
+    rng = random.Random(seed)
+    latencies = {INTERACTIVE: [], BATCH: []}
+    outcomes = {"ok": 0, "overloaded": 0, "deadline": 0}
+
+    async def one_request(priority):
+        start = time.perf_counter()
+        try:
+            if scheduler is None:
+                await llm.call()
+            else:
+                async with scheduler.slot(priority):
+                    await llm.call()
+        except SchedulerRejected as e:
+            outcomes[e.status] += 1
+            return
+        outcomes["ok"] += 1
+        latencies[priority].append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        priority = INTERACTIVE if rng.random() < interactive_share else BATCH
+        tasks.append(asyncio.create_task(one_request(priority)))
+        await asyncio.sleep(rng.expovariate(requests / burst_seconds))
+    await asyncio.gather(*tasks)
+    total = time.perf_counter() - start
+
+    return latencies, outcomes, total
+
+
+def report(name, latencies, outcomes, total, llm, scheduler=None):
+    print(f"\n=== {name} ===")
+    print(f"total time {total:.2f}s, peak upstream calls in flight: {llm.peak_in_flight}")
+    print(f"outcomes: {outcomes}")
+    for priority, label in [(INTERACTIVE, "interactive"), (BATCH, "batch")]:
+        values = latencies[priority]
+        if values:
+            print(f"{label:11s}: n={len(values):4d}  p50={statistics.median(values) * 1000:7.0f} ms"
+                  f"  p95={percentile(values, 0.95) * 1000:7.0f} ms  p99={percentile(values, 0.99) * 1000:7.0f} ms")
+    if scheduler is not None:
+        print(f"scheduler: {scheduler.stats()}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the LLM scheduler with a mock LLM")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--burst-seconds", type=float, default=2.0)
+    parser.add_argument("--interactive-share", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM latency (s) when not overloaded")
+    parser.add_argument("--provider-limit", type=int, default=4, help="calls the mock provider handles at full speed")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--interactive-timeout", type=float, default=3.0)
+    parser.add_argument("--batch-timeout", type=float, default=6.0)
+    args = parser.parse_args()
+
+    llm = MockLLM(args.latency, args.provider_limit)
+    results = await run_load(args.requests, args.burst_seconds, args.interactive_share, llm)
+    report("no scheduler (unlimited fan-out)", *results, llm)
+
+    llm = MockLLM(args.latency, args.provider_limit)
+    scheduler = LLMScheduler(
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        timeouts={INTERACTIVE: args.interactive_timeout, BATCH: args.batch_timeout}
+    )
+    results = await run_load(args.requests, args.burst_seconds, args.interactive_share, llm, scheduler)
+    report("with LLMScheduler", *results, llm, scheduler)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
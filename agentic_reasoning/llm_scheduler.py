@@ -0,0 +1,112 @@
+"""
+Scheduler in front of the LLM backend.
+
+Only max_concurrency LLM calls run at the same time. Everything else waits in a priority
+queue (interactive /stream requests before batch /ask requests, then first come first
+served) until a slot frees up or its deadline passes. When the queue is already full a
+request is rejected right away instead of piling up behind everyone else.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+# lower number = served first
+INTERACTIVE = 0
+BATCH = 1
+
+
+class SchedulerRejected(Exception):
+    """The LLM call was not started. status is "overloaded" (queue full) or "deadline" (waited too long)"""
+    def __init__(self, status, message, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=4, max_queue=32, timeouts=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        # default time (seconds) a request may wait for a slot, per priority
+        self.timeouts = timeouts or {INTERACTIVE: 10.0, BATCH: 30.0}
+        self._active = 0
+        self._queue = []   # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=500)
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _queue_depth(self):
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    async def acquire(self, priority=BATCH, timeout=None):
+        """Wait for a free slot, raises SchedulerRejected when over budget or past the deadline"""
+        start = time.monotonic()
+        if self._active < self.max_concurrency and self._queue_depth() == 0:
+            self._active += 1
+            self._waits.append(0.0)
+            return
+
+        if self._queue_depth() >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerRejected("overloaded", "The assistant is busy right now, please try again shortly.")
+
+        if timeout is None:
+            timeout = self.timeouts.get(priority, 30.0)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._seq), future])
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # the slot may have been handed over just as the deadline hit, give it back
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            self.expired += 1
+            raise SchedulerRejected("deadline", "Timed out waiting for the assistant, please try again.")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+        self._waits.append(time.monotonic() - start)
+
+    def release(self):
+        self.completed += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        # hand the slot straight to the next waiter that is still waiting
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority=BATCH, timeout=None):
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queue_depth(),
+            "max_queue": self.max_queue,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
@@ -10,80 +10,272 @@ the goal is to handle multi-step or cross-manual queries since we know that we c
 import sys
 from pathlib import Path
 import os
+import asyncio
+import operator
+import re
+import time
+from typing import Annotated, TypedDict
 
 #add the parent folder to Python's module search path
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
 sys.path.append(str(PROJECT_ROOT))
 
+from config import OFFLINE_BUNDLE_DIR
+if OFFLINE_BUNDLE_DIR:
+    #set before sentence_transformers is imported, everything has to come from the bundle
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
 from retrieval_backbone.VectorDB import VectorDB
+from retrieval_backbone.bundle import load_bundle, check_llm_backend
+from retrieval_backbone.store_manager import StoreManager
+from agentic_reasoning.session_memory import SessionStore
+from agentic_reasoning.llm_scheduler import LLMScheduler, INTERACTIVE, BATCH
 from langchain_mistralai import ChatMistralAI
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph, END
-from config import MISTRAL_API_KEY
+from langgraph.types import Send
+from profiling import traced, span
+from config import (
+    MISTRAL_API_KEY,
+    LLM_BACKEND,
+    MISTRAL_MODEL,
+    OLLAMA_MODEL,
+    OLLAMA_BASE_URL,
+    MOCK_LLM_ANSWER,
+    MOCK_LLM_CHAR_DELAY,
+    SESSION_MAX_SESSIONS,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_MEMORY_MB,
+    SESSION_MAX_TURNS,
+    SESSION_REUSE_SIMILARITY,
+    SESSION_FOLLOWUP_SIMILARITY,
+    STORE_RELOAD_INTERVAL_SECONDS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_INTERACTIVE,
+    LLM_QUEUE_TIMEOUT_BATCH,
+    RETRIEVAL_HIERARCHICAL,
+    RETRIEVAL_TOP_SECTIONS,
+    RETRIEVAL_MAX_PER_PAGE,
+    FAISS_STORE_DIR,
+)
+import numpy as np
 import os
 
 
 #setup
 os.environ["MISTRAL_API_KEY"] = MISTRAL_API_KEY
+if OFFLINE_BUNDLE_DIR:
+    #fail at startup rather than quietly sending every question to the hosted API
+    check_llm_backend(LLM_BACKEND)
 
 # FAISS DB path (lazy loading - only load when needed)
-FAISS_DIR = PROJECT_ROOT / "faiss_store"
+FAISS_DIR = PROJECT_ROOT / FAISS_STORE_DIR
+
+# model names the planner looks for in a question
+KNOWN_MANUALS = ["A1000", "A300", "A600", "S700"]
+# how many chunks end up in the LLM context
+MAX_CONTEXT_CHUNKS = 5
+# how many raw hits to pull before filtering by manual
+SEARCH_K = 15
+# section-first search settings shared by every db.search call
+SEARCH_OPTIONS = {
+    "hierarchical": RETRIEVAL_HIERARCHICAL,
+    "top_sections": RETRIEVAL_TOP_SECTIONS or None,
+    "max_per_page": RETRIEVAL_MAX_PER_PAGE,
+}
+# how many new chunks a follow-up question may add on top of the previous context
+FOLLOWUP_NEW_CHUNKS = 2
+# words that usually mean the question refers back to the previous one
+FOLLOWUP_WORDS = {"it", "that", "this", "those", "these", "them", "there", "then", "also", "same"}
+
+# conversation memory shared by /ask and /stream
+sessions = SessionStore(
+    max_sessions=SESSION_MAX_SESSIONS,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    max_bytes=SESSION_MAX_MEMORY_MB * 1024 * 1024,
+    max_turns=SESSION_MAX_TURNS
+)
 
 # Global variables for lazy loading
-_db = None
 _llm = None
 
+# every LLM call goes through this so a traffic spike can't fan out unlimited upstream calls
+llm_scheduler = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_queue=LLM_MAX_QUEUE,
+    timeouts={INTERACTIVE: LLM_QUEUE_TIMEOUT_INTERACTIVE, BATCH: LLM_QUEUE_TIMEOUT_BATCH}
+)
+
+
+def load_store(save_dir, previous_db):
+    #reuse the embedding model of the previous snapshot so a reload only reads the index + docs
+    model = previous_db.model if previous_db is not None else None
+    return VectorDB.load(save_dir=save_dir, model=model)
+
+
+# The FAISS store is loaded on first use and hot reloaded when ingestion publishes a new snapshot
+# (or when a new offline bundle is imported, bundles use the same CURRENT pointer layout)
+store = StoreManager(
+    OFFLINE_BUNDLE_DIR or str(FAISS_DIR),
+    load_fn=load_bundle if OFFLINE_BUNDLE_DIR else load_store,
+    version_fn=VectorDB.current_version,
+    poll_interval=STORE_RELOAD_INTERVAL_SECONDS
+)
+
 def get_db():
     """Lazy load the FAISS database - only load when first needed"""
-    global _db
-    if _db is None:
-        _db = VectorDB.load(save_dir=str(FAISS_DIR))
-    return _db
+    store.start_watching()
+    return store.current()
+
+def search_options(db):
+    """SEARCH_OPTIONS, with the settings an offline bundle was exported with taking precedence"""
+    return {**SEARCH_OPTIONS, **getattr(db, "search_options", {})}
+
+def db_session():
+    """Use the FAISS database for one search, a reload can't pull it away in the middle"""
+    store.start_watching()
+    return store.acquire()
 
 def get_llm():
     """Lazy load the LLM - only load when first needed"""
     global _llm
     if _llm is None:
-        _llm = ChatMistralAI(model="mistral-large-latest", temperature=0.3, streaming=True)
+        if LLM_BACKEND == "ollama":
+            #local model for stores without a reliable connection, optional dependency
+            from langchain_ollama import ChatOllama
+            _llm = ChatOllama(model=OLLAMA_MODEL, base_url=OLLAMA_BASE_URL, temperature=0.3)
+        elif LLM_BACKEND == "mock":
+            _llm = make_mock_llm()
+        else:
+            _llm = ChatMistralAI(model=MISTRAL_MODEL, temperature=0.3, streaming=True)
     return _llm
 
 
+def make_mock_llm():
+    """Canned answer at a fixed speed, for load tests and traffic replays without LLM costs"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    class MockChatModel(FakeListChatModel):
+        #streaming waits MOCK_LLM_CHAR_DELAY per character, make /ask take just as long
+        def _call(self, *args, **kwargs):
+            response = super()._call(*args, **kwargs)
+            time.sleep((self.sleep or 0) * max(len(response) - 1, 0))
+            return response
+
+    return MockChatModel(responses=[MOCK_LLM_ANSWER], sleep=MOCK_LLM_CHAR_DELAY)
+
+
+class PipelineState(TypedDict, total=False):
+    """Shared state passed between the agents in the graph"""
+    question: str
+    session_id: str
+    priority: int
+    plan: str
+    manuals_mentioned: list
+    # the manuals the user actually named, manuals_mentioned falls back to all of them
+    manuals_named: list
+    sub_queries: list
+    sub_query: dict
+    # each parallel retrieval branch appends its hits here, the reducer merges them
+    manual_results: Annotated[list, operator.add]
+    context: str
+    images: list
+    sources: list
+    # "new" / "extend" / "reuse" (session context) or "parallel" (comparison branches)
+    retrieval_decision: str
+    final_answer: str
+
+
+@traced("planner")
 def planner_agent(state):
     
     #understands what the user is asking, detects which manuals are mentioned (A1000, A300, etc.), creates a plan for the Retriever and Synthesizer agents
     question = state["question"]
     print(f"Planner thinking about: {question}")
 
-    #default plan text
-    if "compare" in question.lower():
-        plan = "This seems like a comparison question. Retrieve info from all relevant manuals."
-    else:
-        plan = "Retrieve information from the manuals mentioned and summarize it clearly."
-
     #detect which manuals are mentioned in the question
-    manuals_mentioned = []
-    known_manuals = ["A1000", "A300", "A600", "S700"]
+    manuals_named = []
+    known_manuals = KNOWN_MANUALS
 
     for manual in known_manuals:
         if manual.lower() in question.lower():
-            manuals_mentioned.append(manual)
+            manuals_named.append(manual)
+
+    comparison_words = any(word in question.lower() for word in ["compare", "difference", " vs "])
+
+    #a follow-up without a model name stays on the manuals the conversation named,
+    #"compare that with the A300" adds the A300 to them
+    session = sessions.get(state.get("session_id"))
+    if session is not None and session.manuals:
+        if not manuals_named:
+            manuals_named = list(session.manuals)
+        elif comparison_words:
+            manuals_named = [m for m in known_manuals if m in session.manuals or m in manuals_named]
+
+    #only a comparison when at least two manuals are actually named (in the question or the
+    #conversation), "what is the difference between descaling and decalcifying" is not one
+    is_comparison = comparison_words and len(manuals_named) > 1
 
-    #if no manuals are found, assume all
-    if not manuals_mentioned:
-        manuals_mentioned = known_manuals  #search everything by default
+    #if no manuals are named, search all of them (the session still only remembers named ones)
+    manuals_mentioned = manuals_named or known_manuals
 
     print(f"Manuals detected in query: {manuals_mentioned}")
 
+    #default plan text
+    if is_comparison:
+        plan = "This seems like a comparison question. Retrieve info from all relevant manuals."
+    else:
+        plan = "Retrieve information from the manuals mentioned and summarize it clearly."
+
+    #for comparisons we split the question into one sub-query per manual so each manual gets its own search
+    sub_queries = []
+    if is_comparison:
+        sub_queries = [
+            {"manual": manual, "query": make_sub_query(question, manual, manuals_mentioned)}
+            for manual in manuals_mentioned
+        ]
+        print(f"Planner split the question into {len(sub_queries)} sub-queries")
+
     #return everything needed for the next step
     return {
         "plan": plan,
         "question": question,
-        "manuals_mentioned": manuals_mentioned
+        "manuals_mentioned": manuals_mentioned,
+        "manuals_named": manuals_named,
+        "sub_queries": sub_queries
     }
 
 
+def make_sub_query(question, manual, manuals_mentioned):
+    #rewrite the comparison question so it only names one manual,
+    #e.g. "Compare the cleaning of the A300 and A1000" -> "the cleaning of the A1000"
+    names = "|".join(re.escape(m) for m in manuals_mentioned)
+    manual_list = rf"\b(?:{names})\b(?:\s*(?:,|and|&|or|vs\.?|versus)\s*(?:the\s+)?\b(?:{names})\b)+"
+    sub_query = re.sub(manual_list, manual, question, flags=re.IGNORECASE)
+    sub_query = re.sub(r"^\s*(compare|what is the difference between|what are the differences between)\s+", "", sub_query, flags=re.IGNORECASE)
+    sub_query = " ".join(sub_query.split())
+    if manual.lower() not in sub_query.lower():
+        sub_query = f"{manual} {sub_query}"
+    return sub_query
+
+
+def route_retrieval(state):
+    #fan out one retrieval branch per sub-query (LangGraph runs Send branches in parallel),
+    #otherwise fall back to the single retriever
+    sub_queries = state.get("sub_queries") or []
+    if len(sub_queries) > 1:
+        return [
+            Send("manual_retriever", {"question": state["question"], "sub_query": sq})
+            for sq in sub_queries
+        ]
+    return "retriever"
 
+
+
+@traced("retriever")
 def retriever_agent(state):
     #searches the FAISS index for chunks that belong to the manuals detected by the Planner Agent
 
@@ -91,21 +283,9 @@ def retriever_agent(state):
     manuals_mentioned = state["manuals_mentioned"]
     print(f"Retriever fetching chunks for manuals: {manuals_mentioned}")
 
-    # Lazy load database
-    db = get_db()
-    
-    # get all top results first
-    results = db.search(question, k=15)
-
-    #filter results by manual metadata
-    filtered_results = [
-        r for r in results
-        if "manual" in r["metadata"]
-        and any(m in r["metadata"]["manual"] for m in manuals_mentioned)
-    ]
-
-    #take the top 5 after filtering
-    filtered_results = filtered_results[:5]
+    # Lazy load database (held for the whole retrieval so a hot reload can't swap it mid-way)
+    with db_session() as db:
+        filtered_results, decision = retrieve_with_session(db, state, question, manuals_mentioned)
 
     #combine text for the LLM
     context = "\n\n".join([r["text"] for r in filtered_results])
@@ -114,16 +294,192 @@ def retriever_agent(state):
         "question": question,
         "plan": state["plan"],
         "context": context,
-        "manuals_mentioned": manuals_mentioned
+        "images": collect_images(filtered_results),
+        "sources": collect_sources(filtered_results),
+        "manuals_mentioned": manuals_mentioned,
+        "retrieval_decision": decision
     }
 
 
+def retrieve_with_session(db, state, question, manuals_mentioned):
+    #search (or reuse the previous turn's context) and remember what was used in the session
+    query_embedding = db.embed(question)
 
-def synthesizer_agent(state):
+    session = sessions.get(state.get("session_id"))
+    #the session remembers the manuals that were named, not the search-everything default
+    manuals_named = state.get("manuals_named", manuals_mentioned)
+    decision, similarity = decide_context_reuse(session, question, query_embedding, db.version, manuals_named)
+    print(f"Retriever session decision: {decision} (similarity to previous question {similarity:.2f})")
+
+    if decision == "reuse":
+        #same topic as the last turn, the previous context still answers it
+        filtered_results = in_manuals(db.get_results(session.chunk_ids), manuals_mentioned)
+        retrieval_question = session.last_question
+        retrieval_embedding = session.query_embedding
+    else:
+        retrieval_question = question
+        retrieval_embedding = query_embedding
+        if decision == "extend":
+            #search with the previous question attached so "that"/"it" point at the right thing
+            #(capped so a long chain of follow-ups doesn't keep growing the query)
+            retrieval_question = " ".join(f"{session.last_question} {question}".split()[-60:])
+            retrieval_embedding = db.embed(retrieval_question)
+
+        #top results within the manuals mentioned (filtered inside the search, so a manual
+        #with weaker matches isn't pushed out by the others)
+        filtered_results = db.search_by_vector(retrieval_embedding, k=SEARCH_K, query=retrieval_question,
+                                               manuals=manuals_mentioned, **search_options(db))
+
+        if decision == "extend":
+            #keep the previous chunks and only add a few new ones
+            previous = in_manuals(db.get_results(session.chunk_ids), manuals_mentioned)
+            new_results = [r for r in filtered_results if r["index"] not in session.chunk_ids]
+            new_results = new_results[:FOLLOWUP_NEW_CHUNKS]
+            filtered_results = new_results + previous[:MAX_CONTEXT_CHUNKS - len(new_results)]
+
+    #take the top 5 after filtering
+    filtered_results = filtered_results[:MAX_CONTEXT_CHUNKS]
+
+    if session is not None:
+        sessions.update(session, lambda s: s.remember_retrieval(
+            retrieval_question,
+            retrieval_embedding,
+            [r["index"] for r in filtered_results],
+            manuals_named,
+            db.version
+        ))
+
+    return filtered_results, decision
+
+
+def in_manuals(results, manuals):
+    #keep the results whose manual metadata names one of the manuals (same match as VectorDB.manual_ids)
+    return [r for r in results if any(m in r["metadata"].get("manual", "") for m in manuals)]
+
+
+def looks_like_followup(question):
+    #short questions that lean on the previous turn ("and how often should I do that?")
+    words = re.findall(r"[a-z0-9']+", question.lower())
+    if not words:
+        return False
+    return words[0] in {"and", "also", "what", "how", "why"} and len(words) <= 10 and bool(FOLLOWUP_WORDS & set(words))
+
+
+def decide_context_reuse(session, question, query_embedding, store_version=None, manuals=None):
+    """
+    Decide what to do with the previous turn's context:
+    "reuse" it as is, "extend" it with a few new chunks, or search from scratch ("new").
+    """
+    if session is None or session.query_embedding is None or not session.chunk_ids:
+        return "new", 0.0
+    #chunk ids point into the snapshot they came from, after a reload they mean something else
+    if session.store_version != store_version:
+        return "new", 0.0
+    #the previous context is about other manuals ("and on the A300?" after an A1000 question)
+    if manuals is not None and set(manuals) != set(session.manuals):
+        return "new", 0.0
+
+    similarity = float(np.dot(query_embedding, session.query_embedding))
+    if similarity >= SESSION_REUSE_SIMILARITY:
+        return "reuse", similarity
+    if similarity >= SESSION_FOLLOWUP_SIMILARITY or looks_like_followup(question):
+        return "extend", similarity
+    return "new", similarity
+
+
+def collect_images(results, max_images=6):
+    #figures linked to the retrieved chunks (content hashes from the image store), best chunks first
+    images = []
+    for r in results:
+        for image_hash in r["metadata"].get("images", []):
+            if image_hash not in images:
+                images.append(image_hash)
+    return images[:max_images]
+
+
+def collect_sources(results):
+    #manual + page of every chunk in the context, so the frontend can show where the answer came from
+    sources = []
+    for r in results:
+        meta = r["metadata"]
+        source = {
+            "manual": meta.get("manual", "Unknown"),
+            "file": meta.get("source_file", "unknown source"),
+            "page": meta.get("source_page")
+        }
+        if source not in sources:
+            sources.append(source)
+    return sources
+
+
+
+@traced("manual_retriever")
+def manual_retriever_agent(state):
+    #one parallel branch of a comparison question: searches a single manual with its own sub-query
+    sub_query = state["sub_query"]
+    manual = sub_query["manual"]
+    print(f"Retriever branch fetching chunks for {manual}: {sub_query['query']}")
+
+    #search inside this manual only, its top hits can't be crowded out by another manual's
+    with db_session() as db:
+        results = db.search(sub_query["query"], k=SEARCH_K, manuals=[manual], **search_options(db))
+
+    return {"manual_results": [{"manual": manual, "results": results}]}
+
+
+@traced("join_context")
+def join_context_agent(state):
+    #join step for the parallel branches: gives every manual the same share of the context
+    #so one manual can't crowd out the others (and the total stays within MAX_CONTEXT_CHUNKS)
+    manual_results = state.get("manual_results", [])
+    per_manual = max(1, MAX_CONTEXT_CHUNKS // max(len(manual_results), 1))
+
+    sections = []
+    used_results = []
+    manuals = []
+    for group in manual_results:
+        share = group["results"][:min(per_manual, MAX_CONTEXT_CHUNKS - len(used_results))]
+        used_results.extend(share)
+        manuals.append(group["manual"])
+        texts = [r["text"] for r in share]
+        if not texts:
+            texts = ["No relevant information found in this manual."]
+        sections.append(f"=== {group['manual']} ===\n" + "\n\n".join(texts))
+
+    print(f"Joined context from {len(manual_results)} manuals ({per_manual} chunks each)")
+
+    session = sessions.get(state.get("session_id"))
+    if session is not None:
+        question = state["question"]
+        with db_session() as db:
+            query_embedding = db.embed(question)
+            version = db.version
+        sessions.update(session, lambda s: s.remember_retrieval(
+            question,
+            query_embedding,
+            [r["index"] for r in used_results],
+            manuals,
+            version
+        ))
+
+    return {
+        "context": "\n\n".join(sections),
+        "images": collect_images(used_results),
+        "sources": collect_sources(used_results),
+        "retrieval_decision": "parallel"
+    }
+
+
+@traced("synthesizer")
+async def synthesizer_agent(state):
     #enerates a final human-readable answer using the LLM
     prompt = ChatPromptTemplate.from_template("""
     You are an expert on Franke Coffee Systems.
     Based on the context below, answer the user’s question clearly and concisely.
+    The question may refer back to the earlier conversation.
+
+    CONVERSATION SO FAR:
+    {history}
 
     CONTEXT:
     {context}
@@ -138,15 +494,42 @@ def synthesizer_agent(state):
     llm = get_llm()
     
     chain = prompt | llm
-    # Use invoke() for LangGraph compatibility (nodes need to return complete state)
-    response = chain.invoke({
-        "context": state["context"],
-        "question": state["question"]
-    })
+    # Wait for a free LLM slot (batch priority unless the caller says otherwise),
+    # the node returns the complete answer once the call is done
+    async with llm_scheduler.slot(state.get("priority", BATCH)):
+        with span("llm"):
+            response = await chain.ainvoke({
+                "history": format_history(state.get("session_id")),
+                "context": state["context"],
+                "question": state["question"]
+            })
+
+    remember_turn(state.get("session_id"), state["question"], response.content)
 
     return {"final_answer": response.content}
 
-async def stream_synthesizer_agent(context, question):
+
+def format_history(session_id, max_turns=2, max_answer_chars=300):
+    #short version of the last turns, just enough for the LLM to resolve "that"/"it"
+    session = sessions.get(session_id)
+    if session is None or not session.turns:
+        return "(none)"
+    lines = []
+    for turn in session.turns[-max_turns:]:
+        answer = turn["answer"]
+        if len(answer) > max_answer_chars:
+            answer = answer[:max_answer_chars] + "..."
+        lines.append(f"User: {turn['question']}\nAssistant: {answer}")
+    return "\n".join(lines)
+
+
+def remember_turn(session_id, question, answer):
+    session = sessions.get(session_id)
+    if session is not None:
+        sessions.update(session, lambda s: s.add_turn(question, answer))
+
+
+async def stream_synthesizer_agent(context, question, session_id=None):
     """
     Stream LLM response token-by-token.
     Returns an async iterator that yields content chunks.
@@ -154,6 +537,10 @@ async def stream_synthesizer_agent(context, question):
     prompt = ChatPromptTemplate.from_template("""
     You are an expert on Franke Coffee Systems.
     Based on the context below, answer the user’s question clearly and concisely.
+    The question may refer back to the earlier conversation.
+
+    CONVERSATION SO FAR:
+    {history}
 
     CONTEXT:
     {context}
@@ -166,47 +553,70 @@ async def stream_synthesizer_agent(context, question):
     llm = get_llm()
     chain = prompt | llm
     
-    # Stream tokens as they're generated
-    async for chunk in chain.astream({
-        "context": context,
-        "question": question
-    }):
-        # Extract content from chunk
-        content = None
-        if hasattr(chunk, 'content'):
-            content = chunk.content
-        elif hasattr(chunk, 'text'):
-            content = chunk.text
-        elif isinstance(chunk, str):
-            content = chunk
-        elif hasattr(chunk, 'message') and hasattr(chunk.message, 'content'):
-            content = chunk.message.content
-        elif hasattr(chunk, 'get'):
-            content = chunk.get('content') or chunk.get('text')
+    # Interactive requests go ahead of batch /ask requests in the LLM queue,
+    # the slot is held until the whole answer has been streamed
+    async with llm_scheduler.slot(INTERACTIVE):
+        # Stream tokens as they're generated
+        async for chunk in chain.astream({
+            "history": format_history(session_id),
+            "context": context,
+            "question": question
+        }):
+            # Extract content from chunk
+            content = None
+            if hasattr(chunk, 'content'):
+                content = chunk.content
+            elif hasattr(chunk, 'text'):
+                content = chunk.text
+            elif isinstance(chunk, str):
+                content = chunk
+            elif hasattr(chunk, 'message') and hasattr(chunk.message, 'content'):
+                content = chunk.message.content
+            elif hasattr(chunk, 'get'):
+                content = chunk.get('content') or chunk.get('text')
         
-        if content:
-            yield str(content)
+            if content:
+                yield str(content)
+
+#nodes whose output holds the final context (used by the streaming endpoint)
+CONTEXT_NODES = ("retriever", "join_context")
+
+
+def build_workflow(synthesize=True):
+    """Create the Graph (agent flow). synthesize=False stops after retrieval (used for benchmarks)"""
+    workflow = StateGraph(PipelineState)
 
-#create the Graph (agent flow)
-workflow = StateGraph(dict)
+    #add each agent as a node
+    workflow.add_node("planner", planner_agent)
+    workflow.add_node("retriever", retriever_agent)
+    workflow.add_node("manual_retriever", manual_retriever_agent)
+    workflow.add_node("join_context", join_context_agent)
+
+    #define the path (edges)
+    #planner either goes to the single retriever or fans out to one manual_retriever per sub-query
+    workflow.add_conditional_edges("planner", route_retrieval, ["retriever", "manual_retriever"])
+    workflow.add_edge("manual_retriever", "join_context")
+
+    if synthesize:
+        workflow.add_node("synthesizer", synthesizer_agent)
+        workflow.add_edge("retriever", "synthesizer")
+        workflow.add_edge("join_context", "synthesizer")
+        workflow.add_edge("synthesizer", END)
+    else:
+        workflow.add_edge("retriever", END)
+        workflow.add_edge("join_context", END)
 
-#add each agent as a node
-workflow.add_node("planner", planner_agent)
-workflow.add_node("retriever", retriever_agent)
-workflow.add_node("synthesizer", synthesizer_agent)
+    #start the workflow
+    workflow.set_entry_point("planner")
+    return workflow
 
-#define the path (edges)
-workflow.add_edge("planner", "retriever")
-workflow.add_edge("retriever", "synthesizer")
-workflow.add_edge("synthesizer", END)
 
-#start the workflow
-workflow.set_entry_point("planner")
+workflow = build_workflow()
 
 #test
 if __name__ == "__main__":
     user_question = "How do I safely clean the milk system in the A1000 and what hazards should I watch out for?" #"Compare the cleaning procedures of the A300 and A1000."
-    result = workflow.compile().invoke({"question": user_question})
+    result = asyncio.run(workflow.compile().ainvoke({"question": user_question}))
 
     print("\nFinal Answer:\n")
     print(result["final_answer"])
@@ -0,0 +1,138 @@
+"""
+Server-side conversation memory for multi-turn questions.
+
+Each session keeps its last few turns plus what the retriever used for the previous
+question (chunk ids in the FAISS index, the query embedding and the manuals), so a
+follow-up like "and how often should I do that?" can reuse or extend that context
+instead of re-planning and re-retrieving from scratch.
+
+The store is bounded: least recently used sessions are evicted when there are too many
+or when the total memory goes over the cap, and idle sessions expire after a TTL.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Session:
+    """Memory of one conversation"""
+    def __init__(self, session_id, max_turns=6):
+        self.session_id = session_id
+        self.max_turns = max_turns
+        self.turns = []              # [{"question", "answer"}], oldest first
+        self.last_question = None    # question the current context was retrieved for
+        self.query_embedding = None  # normalized embedding of last_question
+        self.chunk_ids = []          # positions in the FAISS index of the chunks in the context
+        self.manuals = []            # manuals the conversation is about
+        self.store_version = None    # which FAISS store the chunk ids belong to
+        self.last_used = time.monotonic()
+
+    def add_turn(self, question, answer):
+        self.turns.append({"question": question, "answer": answer})
+        del self.turns[:-self.max_turns]
+
+    def remember_retrieval(self, question, query_embedding, chunk_ids, manuals, store_version=None):
+        self.last_question = question
+        self.query_embedding = query_embedding
+        self.chunk_ids = list(chunk_ids)
+        self.manuals = list(manuals)
+        self.store_version = store_version
+
+    def size_bytes(self):
+        """Rough memory used by this session (text + embedding + ids)"""
+        size = 200
+        for turn in self.turns:
+            size += len(turn["question"]) + len(turn["answer"])
+        if self.last_question:
+            size += len(self.last_question)
+        if self.query_embedding is not None:
+            size += self.query_embedding.nbytes
+        size += 8 * len(self.chunk_ids)
+        return size
+
+
+class SessionStore:
+    """Bounded LRU + TTL store of sessions, safe to use from the graph's worker threads"""
+    def __init__(self, max_sessions=1000, ttl_seconds=1800, max_bytes=64 * 1024 * 1024, max_turns=6):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def get_or_create(self, session_id=None):
+        """Return the session with this id, or start a new one (new id) if it is unknown/expired"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex, max_turns=self.max_turns)
+                self._sessions[session.session_id] = session
+                self._sizes[session.session_id] = 0
+            self._touch(session)
+            self._evict()
+            return session
+
+    def get(self, session_id):
+        if not session_id:
+            return None
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._touch(session)
+            return session
+
+    def update(self, session, fn):
+        """Change a session under the lock, then re-account its memory"""
+        with self._lock:
+            fn(session)
+            if session.session_id in self._sessions:
+                self._touch(session)
+                self._evict()
+
+    def _touch(self, session):
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session.session_id)
+        new_size = session.size_bytes()
+        self._total_bytes += new_size - self._sizes.get(session.session_id, 0)
+        self._sizes[session.session_id] = new_size
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
+
+    def _expire(self):
+        # sessions are ordered by last use, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            self._remove(session_id)
+            self.expired += 1
+
+    def _evict(self):
+        # keep the most recently used session even if it alone is over the cap
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            session_id = next(iter(self._sessions))
+            self._remove(session_id)
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": self._total_bytes,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
@@ -2,3 +2,85 @@
 
 
 MISTRAL_API_KEY = ""
+
+
+#LLM backend: "mistral" (hosted API, needs the key above), "ollama" (local server, works offline)
+#or "mock" (canned answer at a fixed speed, for load tests and traffic replays)
+LLM_BACKEND = "mistral"
+MISTRAL_MODEL = "mistral-large-latest"
+#for ollama: `ollama pull <model>` on the box first (needs `pip install langchain-ollama`)
+OLLAMA_MODEL = "mistral"
+OLLAMA_BASE_URL = "http://localhost:11434"
+#for mock: seconds per streamed character (~1.5 s for the whole answer)
+MOCK_LLM_ANSWER = (
+    "This is a mock answer used for load testing. The manual context was retrieved as usual, "
+    "but no language model was called. Set LLM_BACKEND back to \"mistral\" or \"ollama\" for real answers."
+)
+MOCK_LLM_CHAR_DELAY = 0.007
+
+
+#FAISS store the ingestion (retrieval_backbone/franke_processor_regex_multi.py) publishes to and the
+#API serves and hot reloads from, relative to the project root
+FAISS_STORE_DIR = "faiss_store"
+
+
+#offline bundle directory (see retrieval_backbone/bundle.py import), when set the API serves the
+#bundle imported there instead of faiss_store and never asks the Hugging Face hub for the model
+#(needs LLM_BACKEND = "ollama", or "mock", the API doesn't start with the hosted Mistral API)
+OFFLINE_BUNDLE_DIR = ""
+
+
+#streaming (/stream websocket)
+#tokens are grouped into one frame until this many ms have passed or this many bytes are buffered
+STREAM_FLUSH_INTERVAL_MS = 50
+STREAM_FLUSH_BYTES = 512
+#permessage-deflate compression for the websocket frames (used when starting with `python main.py`)
+STREAM_PERMESSAGE_DEFLATE = True
+
+
+#conversation sessions (multi-turn memory for /ask and /stream)
+SESSION_MAX_SESSIONS = 1000
+SESSION_TTL_SECONDS = 30 * 60
+SESSION_MAX_MEMORY_MB = 64
+SESSION_MAX_TURNS = 6
+#cosine similarity to the previous question above which its context is reused as is
+SESSION_REUSE_SIMILARITY = 0.85
+#above this (or when the question looks like a follow-up) the previous context is extended
+SESSION_FOLLOWUP_SIMILARITY = 0.5
+
+
+#two-stage retrieval: pick the best sections first, then rank only their chunks (False = score every chunk)
+RETRIEVAL_HIERARCHICAL = True
+#how many sections the first stage keeps (0 = about half the number of chunks requested)
+RETRIEVAL_TOP_SECTIONS = 0
+#at most this many chunks of the same page in one result list
+RETRIEVAL_MAX_PER_PAGE = 2
+
+
+#traffic recording (see traffic.py): anonymized /ask and /stream requests to replay as a load test
+#file the requests are appended to, leave empty to turn recording off
+TRAFFIC_RECORD_FILE = ""
+#fraction of requests (0.0 - 1.0) that are recorded
+TRAFFIC_RECORD_SAMPLE_RATE = 1.0
+
+
+#how often (seconds) API workers check for a newly published FAISS snapshot, 0 turns hot reload off
+STORE_RELOAD_INTERVAL_SECONDS = 5
+
+
+#LLM scheduler: at most this many LLM calls at once, the rest wait in a priority queue
+LLM_MAX_CONCURRENCY = 4
+#requests are rejected right away (HTTP 503 / error frame) once this many are waiting
+LLM_MAX_QUEUE = 32
+#how long (seconds) a request may wait for a slot: interactive /stream vs batch /ask
+LLM_QUEUE_TIMEOUT_INTERACTIVE = 10
+LLM_QUEUE_TIMEOUT_BATCH = 30
+
+
+#profiling (see profiling.py), everything is written to PROFILING_OUTPUT_DIR
+#token for POST /admin/profile (header X-Admin-Token), leave empty to turn the endpoint off
+PROFILING_ADMIN_TOKEN = ""
+PROFILING_MAX_SECONDS = 60
+PROFILING_OUTPUT_DIR = "profiles"
+#fraction of requests (0.0 - 1.0) whose pipeline stages are traced into traces.folded
+PROFILING_TRACE_SAMPLE_RATE = 0.0
@@ -1,7 +1,7 @@
 import React from 'react'
 import ReactMarkdown from 'react-markdown'
 
-const MessageBubble = ({ text = '', isUser = false, label }) => {
+const MessageBubble = ({ text = '', images = [], isUser = false, label }) => {
   const wrapperStyle = {
     display: 'flex',
     flexDirection: 'column',
@@ -45,6 +45,22 @@ const MessageBubble = ({ text = '', isUser = false, label }) => {
     fontFamily: 'Manrope',
   }
 
+  // Figures from the manuals shown under the answer
+  const imageGridStyle = {
+    display: 'flex',
+    flexWrap: 'wrap',
+    gap: '8px',
+    marginTop: '10px',
+  }
+
+  const imageStyle = {
+    maxWidth: '160px',
+    maxHeight: '160px',
+    borderRadius: '6px',
+    border: '1px solid rgba(0, 0, 0, 0.08)',
+    backgroundColor: '#fff',
+  }
+
   // Check if this is a "Thinking..." message
   const isThinking = !isUser && text === 'Thinking...'
 
@@ -167,6 +183,25 @@ const MessageBubble = ({ text = '', isUser = false, label }) => {
             >
               {text}
             </ReactMarkdown>
+            {images.length > 0 && (
+              <div style={imageGridStyle}>
+                {images.map((image) => (
+                  <a
+                    key={image.hash}
+                    href={image.full}
+                    target="_blank"
+                    rel="noreferrer"
+                  >
+                    <img
+                      src={image.thumb}
+                      alt="Figure from the manual"
+                      loading="lazy"
+                      style={imageStyle}
+                    />
+                  </a>
+                ))}
+              </div>
+            )}
           </div>
         )}
       </div>
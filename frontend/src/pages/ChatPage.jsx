@@ -3,6 +3,17 @@ import ChatInput from '../components/ChatInput'
 import MessageBubble from '../components/MessageBubble'
 import logo from '../assets/7-11logo.png'
 
+// Default to localhost:8000 for development
+const apiUrl = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000'
+
+// Figures are content-addressed, so the same URL always means the same image
+// and the browser can serve repeats from its cache
+const imageUrls = (hash) => ({
+  hash,
+  thumb: `${apiUrl}/images/${hash}/thumb`,
+  full: `${apiUrl}/images/${hash}`,
+})
+
 const ChatPage = () => {
   const [messages, setMessages] = useState([
     {
@@ -13,6 +24,9 @@ const ChatPage = () => {
   ])
 
   const messagesEndRef = useRef(null)
+  // Server-side conversation session, sent with every question so follow-ups
+  // can reuse the previous context
+  const sessionIdRef = useRef(null)
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -41,7 +55,6 @@ const ChatPage = () => {
       // Determine WebSocket URL based on environment
       // Default to localhost:8000 for development
       const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
-      const apiUrl = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000'
       const wsHost = apiUrl
         .replace(/^https?:\/\//, '')
         .replace(/^wss?:\/\//, '')
@@ -51,27 +64,77 @@ const ChatPage = () => {
 
       ws.onopen = () => {
         // Send the question to the backend
-        ws.send(JSON.stringify({ question: text }))
+        ws.send(
+          JSON.stringify({ question: text, session_id: sessionIdRef.current })
+        )
       }
 
-      ws.onmessage = (event) => {
-        // Update the AI message with streaming text
+      const updateAiMessage = (update) => {
         setMessages((prev) =>
-          prev.map((msg) =>
-            msg.id === aiMessageId
-              ? {
-                  ...msg,
-                  // Replace "Thinking..." with the actual response when streaming starts
-                  text:
-                    msg.text === 'Thinking...'
-                      ? event.data
-                      : msg.text + event.data,
-                }
-              : msg
-          )
+          prev.map((msg) => (msg.id === aiMessageId ? update(msg) : msg))
         )
       }
 
+      // Token frames are buffered and applied at most once per animation
+      // frame, so a burst of frames only causes one React render
+      let pendingText = ''
+      let renderScheduled = false
+      const clientStats = { frames: 0, renders: 0, handlerMs: 0 }
+      const startedAt = performance.now()
+
+      const flushPendingText = () => {
+        renderScheduled = false
+        if (!pendingText) return
+        const textToAdd = pendingText
+        pendingText = ''
+        clientStats.renders += 1
+        updateAiMessage((msg) => ({
+          ...msg,
+          // Replace "Thinking..." with the actual response when streaming starts
+          text: msg.text === 'Thinking...' ? textToAdd : msg.text + textToAdd,
+        }))
+      }
+
+      ws.onmessage = (event) => {
+        const handlerStart = performance.now()
+        clientStats.frames += 1
+        const frame = JSON.parse(event.data)
+
+        if (frame.type === 'tokens') {
+          pendingText += frame.data
+          if (!renderScheduled) {
+            renderScheduled = true
+            requestAnimationFrame(flushPendingText)
+          }
+        } else if (frame.type === 'sources') {
+          updateAiMessage((msg) => ({
+            ...msg,
+            images: frame.images.map(imageUrls),
+          }))
+        } else if (frame.type === 'done') {
+          flushPendingText()
+          sessionIdRef.current = frame.session_id
+          const seconds = (performance.now() - startedAt) / 1000
+          console.info('Stream stats', {
+            server: frame.stats,
+            client: {
+              ...clientStats,
+              framesPerSec: +(clientStats.frames / seconds).toFixed(1),
+              handlerMs: +clientStats.handlerMs.toFixed(1),
+            },
+          })
+          ws.close()
+        } else if (frame.type === 'error') {
+          flushPendingText()
+          updateAiMessage((msg) => ({
+            ...msg,
+            text: `Error: ${frame.message}`,
+          }))
+        }
+
+        clientStats.handlerMs += performance.now() - handlerStart
+      }
+
       ws.onerror = (error) => {
         console.error('WebSocket error:', error)
         setMessages((prev) =>
@@ -226,6 +289,7 @@ const ChatPage = () => {
           <MessageBubble
             key={msg.id}
             text={msg.text}
+            images={msg.images}
             isUser={msg.isUser}
             label={msg.isUser ? 'ME' : 'OUR AI'}
           />
@@ -1,69 +1,335 @@
 # main.py
-from fastapi import FastAPI
-from agentic_reasoning.multi_agent_pipeline import workflow, stream_synthesizer_agent
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from agentic_reasoning.multi_agent_pipeline import (
+    workflow,
+    stream_synthesizer_agent,
+    remember_turn,
+    sessions,
+    store,
+    llm_scheduler,
+    CONTEXT_NODES,
+)
+from agentic_reasoning.llm_scheduler import SchedulerRejected, BATCH
 from pydantic import BaseModel
 from fastapi import WebSocket
+from pathlib import Path
+from retrieval_backbone.image_store import ImageStore
+from streaming import coalesce, make_frame, StreamStats
+from config import (
+    STREAM_FLUSH_INTERVAL_MS,
+    STREAM_FLUSH_BYTES,
+    STREAM_PERMESSAGE_DEFLATE,
+    PROFILING_ADMIN_TOKEN,
+    PROFILING_MAX_SECONDS,
+    PROFILING_OUTPUT_DIR,
+    PROFILING_TRACE_SAMPLE_RATE,
+    TRAFFIC_RECORD_FILE,
+    TRAFFIC_RECORD_SAMPLE_RATE,
+)
+from profiling import StackSampler, start_trace, span, output_path
+from traffic import TrafficRecorder, summarize_plan
+from typing import Optional
+import cProfile
+import hmac
+from contextlib import aclosing
 import asyncio
+import re
+import time
 
 class Question(BaseModel):
     question: str
+    # pass the session_id from the previous answer to ask a follow-up question
+    session_id: Optional[str] = None
 
 # Compile the workflow once at module level
 pipeline_app = workflow.compile()
 
+# Figures extracted during ingestion, stored by content hash
+image_store = ImageStore(Path(__file__).resolve().parent / "data" / "images")
+# Image URLs never change content (the name is the hash), so browsers can cache them forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 # Create FastAPI app
 app = FastAPI()
 
+# only one profile capture at a time per worker
+profile_lock = asyncio.Lock()
+
+# anonymized request log for load test replays (traffic.py), off unless a file is configured
+traffic = TrafficRecorder(TRAFFIC_RECORD_FILE, TRAFFIC_RECORD_SAMPLE_RATE) if TRAFFIC_RECORD_FILE else None
+
+
+async def trace_requests(request: Request, call_next):
+    # a sampled fraction of requests gets its pipeline stages timed into traces.folded
+    with start_trace(f"{request.method} {request.url.path}", PROFILING_TRACE_SAMPLE_RATE, PROFILING_OUTPUT_DIR):
+        return await call_next(request)
+
+
+# only registered when tracing is on, otherwise every request would pay for the middleware
+if PROFILING_TRACE_SAMPLE_RATE > 0:
+    app.middleware("http")(trace_requests)
+
 @app.get("/")
 async def root():
     return {
         "message": "7-11 Agentic AI API",
         "endpoints": {
             "POST /ask": "Ask a question (requires JSON body with 'question' field)",
-            "POST /stream": "Stream the answer to a question (websocket)"
+            "POST /stream": "Stream the answer to a question (websocket)",
+            "GET /images/{hash}": "Get a figure from the manuals (add /thumb for the thumbnail)",
+            "GET /metrics/stream": "Frame and CPU counters for the /stream websocket",
+            "GET /metrics/sessions": "Number and memory of the conversation sessions",
+            "GET /metrics/store": "FAISS snapshot in use and hot reload counters",
+            "GET /metrics/llm": "LLM scheduler queue depth, wait times and rejections",
+            "GET /metrics/traffic": "Traffic recorder counters (when recording is on)",
+            "POST /admin/profile": "Capture a profile of this worker (needs X-Admin-Token)"
         }
     }
 
 
 @app.post("/ask")
 async def ask(question: Question):
-    result = pipeline_app.invoke({"question": question.question})
-    return {"answer": result["final_answer"]}
+    # ainvoke lets LangGraph run the parallel retrieval branches without blocking the event loop
+    session = sessions.get_or_create(question.session_id)
+    started = time.time()
+    recording = traffic is not None and traffic.sample()
+    try:
+        result = await pipeline_app.ainvoke({
+            "question": question.question,
+            "session_id": session.session_id,
+            "priority": BATCH
+        })
+    except SchedulerRejected as e:
+        if recording:
+            traffic.record("ask", question.question, session.session_id, started, e.status)
+        # fail fast with a clear status instead of hanging while the LLM is overloaded
+        return JSONResponse(
+            status_code=503,
+            content={"error": e.status, "detail": str(e), "session_id": session.session_id},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception:
+        if recording:
+            traffic.record("ask", question.question, session.session_id, started, "error")
+        raise
+    if recording:
+        traffic.record("ask", question.question, session.session_id, started, "ok",
+                       plan=summarize_plan(result), retrieval=result.get("retrieval_decision"))
+    return {
+        "answer": result["final_answer"],
+        "images": result.get("images", []),
+        "session_id": session.session_id
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    # If-None-Match is "*" or a list of (possibly weak, W/"...") tags, compared weakly
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def serve_image(request: Request, image_hash: str, path):
+    # the hash is the ETag, if the browser already has this image just answer 304
+    etag = f'"{image_hash}"'
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+def check_image_hash(image_hash: str):
+    if not re.fullmatch(r"[0-9a-f]{64}", image_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+
+@app.get("/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    check_image_hash(image_hash)
+    path = image_store.find(image_hash)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return serve_image(request, image_hash, path)
+
+
+@app.get("/images/{image_hash}/thumb")
+async def get_image_thumb(image_hash: str, request: Request):
+    check_image_hash(image_hash)
+    path = image_store.thumb_path(image_hash)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    return serve_image(request, f"{image_hash}-thumb", path)
 
 @app.websocket("/stream")
 async def stream(websocket: WebSocket):
     await websocket.accept()
+    with start_trace("WS /stream", PROFILING_TRACE_SAMPLE_RATE, PROFILING_OUTPUT_DIR):
+        await stream_answer(websocket)
+
+
+async def stream_answer(websocket: WebSocket):
+    started = time.time()
+    recording = traffic is not None and traffic.sample()
+    question = None
+    session = None
+    plan = None
+    retrieval = None
+    first_token = None
+    status = "error"
     try:
         # Frontend sends the question through the websocket
         data = await websocket.receive_json()
         question = data["question"]
+        session = sessions.get_or_create(data.get("session_id"))
 
         # Step 1: Run pipeline up to retriever to get context
-        # (Planner → Retriever to get relevant chunks)
+        # (Planner → Retriever to get relevant chunks, or the parallel
+        # per-manual retrievers + join step for comparison questions)
         context = None
+        images = []
+        sources = []
         
-        for event in pipeline_app.stream({"question": question}):
-            for node_name, node_output in event.items():
-                if node_name == "retriever" and isinstance(node_output, dict):
-                    context = node_output.get("context", "")
+        with span("retrieval"):
+            async for event in pipeline_app.astream({"question": question, "session_id": session.session_id}):
+                for node_name, node_output in event.items():
+                    if node_name == "planner" and isinstance(node_output, dict):
+                        plan = summarize_plan(node_output)
+                    if node_name in CONTEXT_NODES and isinstance(node_output, dict):
+                        context = node_output.get("context", "")
+                        images = node_output.get("images", [])
+                        sources = node_output.get("sources", [])
+                        retrieval = node_output.get("retrieval_decision")
+                        break
+                if context is not None:
                     break
-            if context is not None:
-                break
-
-        # Step 2: Stream LLM response token-by-token using the synthesizer streaming function
-        async for content in stream_synthesizer_agent(context, question):
-            try:
-                # Send each token/chunk to frontend as it arrives
-                await websocket.send_text(content)
-            except:
-                # Connection closed by client, stop streaming
-                break
+
+        # Let the frontend show the sources and figures for the retrieved chunks right away
+        await websocket.send_json(make_frame("sources", sources=sources, images=images))
+
+        # Step 2: Stream LLM response using the synthesizer streaming function.
+        # The small LLM chunks are coalesced into bigger "tokens" frames so the
+        # frontend gets a few frames per second instead of one per token
+        stats = StreamStats()
+        answer_parts = []
+        status = "ok"
+        tokens = stats.count_chunks(stream_synthesizer_agent(context, question, session.session_id))
+        with span("llm_stream"):
+            async with aclosing(coalesce(tokens, STREAM_FLUSH_INTERVAL_MS, STREAM_FLUSH_BYTES)) as batches:
+                async for batch in batches:
+                    try:
+                        answer_parts.append(batch)
+                        await websocket.send_json(make_frame("tokens", data=batch))
+                        stats.record(batch)
+                        if first_token is None:
+                            first_token = time.time() - started
+                    except:
+                        # Connection closed by client, stop streaming
+                        status = "disconnected"
+                        break
+
+        remember_turn(session.session_id, question, "".join(answer_parts))
+
+        result = stats.finish()
+        print(f"Stream finished: {result}")
+        # nobody left to tell when the client went away mid-answer
+        if status != "disconnected":
+            await websocket.send_json(make_frame("done", stats=result, session_id=session.session_id))
+
+    except SchedulerRejected as e:
+        status = e.status
+        # LLM queue is over budget or the wait passed the deadline
+        try:
+            await websocket.send_json(make_frame("error", status=e.status, message=str(e)))
+        except:
+            pass
 
     except Exception as e:
+        if status != "disconnected":
+            status = "error"
         # Try to send error, but don't fail if connection is closed
         try:
-            await websocket.send_text(f"Error: {str(e)}")
+            await websocket.send_json(make_frame("error", message=str(e)))
         except:
             pass
 
-    
+    finally:
+        if recording and question is not None:
+            traffic.record("stream", question, session.session_id if session else None, started, status,
+                           plan=plan, retrieval=retrieval, ttft=first_token)
+
+
+@app.get("/metrics/stream")
+async def stream_metrics():
+    return StreamStats.summary()
+
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    return sessions.stats()
+
+
+@app.get("/metrics/store")
+async def store_metrics():
+    return store.stats()
+
+
+@app.get("/metrics/llm")
+async def llm_metrics():
+    return llm_scheduler.stats()
+
+
+@app.get("/metrics/traffic")
+async def traffic_metrics():
+    return traffic.stats() if traffic is not None else {"enabled": False}
+
+
+@app.post("/admin/profile")
+async def capture_profile(seconds: float = 10, mode: str = "sample", x_admin_token: Optional[str] = Header(None)):
+    """
+    Profile this worker for a few seconds while it keeps serving traffic.
+    mode=sample: samples every thread, writes a .folded file (flamegraph)
+    mode=cprofile: cProfile of the event loop thread only, writes a .prof file
+    """
+    # the endpoint doesn't exist unless a token is configured
+    if not PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), PROFILING_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if mode not in ("sample", "cprofile"):
+        raise HTTPException(status_code=400, detail="mode must be 'sample' or 'cprofile'")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already being captured")
+
+    seconds = max(0.1, min(seconds, PROFILING_MAX_SECONDS))
+    async with profile_lock:
+        if mode == "sample":
+            sampler = StackSampler()
+            sampler.start()
+            await asyncio.sleep(seconds)
+            sampler.stop()
+            path = sampler.write_folded(output_path(PROFILING_OUTPUT_DIR, "api-sample", ".folded"))
+            return {"mode": mode, "seconds": seconds, "samples": sampler.samples, "file": str(path)}
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        await asyncio.sleep(seconds)
+        profiler.disable()
+        path = output_path(PROFILING_OUTPUT_DIR, "api-cprofile", ".prof")
+        profiler.dump_stats(str(path))
+        return {"mode": mode, "seconds": seconds, "file": str(path)}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # permessage-deflate compresses the JSON frames on the wire (the browser negotiates it automatically)
+    uvicorn.run("main:app", host="127.0.0.1", port=8000, ws_per_message_deflate=STREAM_PERMESSAGE_DEFLATE)
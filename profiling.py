@@ -0,0 +1,211 @@
+"""
+Opt-in profiling for the API and the ingestion scripts.
+
+Everything here writes plain files under PROFILING_OUTPUT_DIR:
+    *.folded   "frame;frame;frame <count>" lines, open with flamegraph.pl or speedscope.app
+    *.prof     cProfile stats, open with snakeviz or `python -m pstats`
+
+Three ways to use it:
+    StackSampler       samples every thread of a live process for a few seconds (admin endpoint)
+    profile_call()     runs a function under cProfile + the sampler (`--profile` of the scripts)
+    start_trace/span   times the pipeline stages of a sampled fraction of requests
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def output_path(output_dir, prefix, suffix):
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return Path(output_dir) / f"{prefix}-{stamp}-{os.getpid()}{suffix}"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples the Python stack of every thread at a fixed interval from a background thread.
+    Cheap enough to run against a live worker, and sees the graph's worker threads too
+    (cProfile only sees the thread it was started in).
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def profile_call(fn, output_dir="profiles", prefix="profile", stages=None):
+    """
+    Run fn() under cProfile and the stack sampler, write <prefix>-*.prof and <prefix>-*.folded
+    and print where the time went. stages maps a label to a function name, e.g.
+    {"OCR": "ocr_page"}, and prints the cumulative time spent in each.
+    """
+    sampler = StackSampler()
+    profiler = cProfile.Profile()
+    sampler.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        total = time.perf_counter() - start
+        sampler.stop()
+
+        prof_path = output_path(output_dir, prefix, ".prof")
+        profiler.dump_stats(str(prof_path))
+        folded_path = sampler.write_folded(output_path(output_dir, prefix, ".folded"))
+
+        stats = pstats.Stats(profiler)
+        print(f"\n--- Profile ({total:.1f}s total) ---")
+        if stages:
+            for label, seconds in stage_times(stats, stages).items():
+                share = seconds / total * 100 if total > 0 else 0
+                print(f"{label:20s} {seconds:8.2f}s  {share:5.1f}%")
+        stats.sort_stats("cumulative").print_stats(20)
+        print(f"cProfile stats: {prof_path}")
+        print(f"Flamegraph stacks: {folded_path}")
+
+
+def stage_times(stats, stages):
+    # cumulative time of the named functions (summed if the name appears in several files)
+    result = {}
+    for label, function_name in stages.items():
+        seconds = 0.0
+        for (_, _, name), (_, _, _, cumulative, _) in stats.stats.items():
+            if name == function_name:
+                seconds += cumulative
+        result[label] = seconds
+    return result
+
+
+# --- per-request tracing ---
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_stack = contextvars.ContextVar("current_trace_stack", default=())
+_trace_file_lock = threading.Lock()
+
+
+class RequestTrace:
+    """Timings of the spans of one request, written as folded stacks (weight = microseconds)"""
+    def __init__(self, name):
+        self.name = name
+        self.spans = []   # (stack tuple, seconds), appended from any thread of the request
+
+    def folded_lines(self):
+        totals = {}
+        for stack, seconds in self.spans:
+            totals[stack] = totals.get(stack, 0.0) + seconds
+        lines = []
+        for stack, seconds in totals.items():
+            # self time = time not spent in child spans (parallel children can add up to more)
+            children = sum(t for s, t in totals.items() if len(s) == len(stack) + 1 and s[:len(stack)] == stack)
+            self_us = int(max(0.0, seconds - children) * 1e6)
+            if self_us > 0:
+                lines.append(f"{';'.join(stack)} {self_us}")
+        return lines
+
+
+@contextmanager
+def start_trace(name, sample_rate, output_dir="profiles"):
+    """Trace this request with probability sample_rate, appends to <output_dir>/traces.folded"""
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        yield None
+        return
+
+    trace = RequestTrace(name)
+    trace_token = _current_trace.set(trace)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_trace.reset(trace_token)
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        with _trace_file_lock:
+            with open(Path(output_dir) / "traces.folded", "a", encoding="utf-8") as f:
+                for line in trace.folded_lines():
+                    f.write(line + "\n")
+
+
+@contextmanager
+def span(name):
+    """Time a block as part of the current trace (does nothing when the request isn't traced)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    stack = _current_stack.get() + (name,)
+    token = _current_stack.set(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((stack, time.perf_counter() - start))
+        _current_stack.reset(token)
+
+
+def traced(name):
+    """Decorator version of span() for sync and async functions"""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -3,25 +3,43 @@ import numpy as np
 import faiss
 import pickle
 import os
+import shutil
+import time
+import uuid
+
+# file inside save_dir that names the snapshot currently published
+CURRENT_POINTER = "CURRENT"
+SNAPSHOT_DIR = "snapshots"
 
 class VectorDB:
     """
     FAISS-based vector database for document retrieval using sentence embeddings.
     Uses SentenceTransformer for storing document chunks and similarity searching.
     """
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        # initialize the embedding model
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name="all-MiniLM-L6-v2", model=None):
+        # initialize the embedding model (or reuse an already loaded one)
+        self.model = model if model is not None else SentenceTransformer(model_name)
+        self.model_name = model_name
         self.index = None   # FAISS index
         self.documents = [] # keep track of text + metadata
         self.dim = None     # dimension of embeddings
+        self.version = None # snapshot this db was loaded from / saved as
+        # two-stage (section -> chunk) index, see build_hierarchy()
+        self.section_index = None    # FAISS index of one summary vector per section
+        self.section_members = []    # for each section, positions of its chunks in self.index
+        self.chunk_vectors = None    # view on the chunk vectors in self.index to score a section's chunks
+        self._manual_ids = {}        # manuals -> positions of their chunks, see manual_ids()
+        self._manual_sections = {}   # manuals -> sections holding at least one of their chunks
+        self.search_options = {}     # search settings that came with the store (offline bundles)
 
     # add documents and build index
     def add_documents(self, documents):
         if not documents:
             print("No documents to add.")
             return
-        
+        if not isinstance(self.documents, list):
+            self._make_writable()
+
         # extract text from the docs
         texts = [doc["text"] for doc in documents]
         # embed the texts using the model
@@ -38,69 +56,285 @@ class VectorDB:
         self.index.add(np.array(embeddings).astype("float32"))
         # store the documents with metadata
         self.documents.extend(documents)
+        # the section index is rebuilt on the next save / hierarchical search (and adding may
+        # have moved the index storage the chunk_vectors view points into)
+        self.section_index = None
+        self.chunk_vectors = None
+        self._manual_ids = {}
+        self._manual_sections = {}
         print(f"Added {len(documents)} documents. Total vectors in index: {self.index.ntotal}")
 
+    def manual_ids(self, manuals):
+        """Positions of the chunks whose "manual" metadata contains one of the manual names"""
+        key = tuple(sorted(manuals))
+        ids = self._manual_ids.get(key)
+        if ids is None:
+            ids = np.array([
+                i for i, doc in enumerate(self.documents)
+                if any(m in doc.get("metadata", {}).get("manual", "") for m in manuals)
+            ], dtype="int64")
+            self._manual_ids[key] = ids
+        return ids
+
+    def manual_sections(self, manuals):
+        """Sections (positions in self.section_index) with at least one chunk of the manuals"""
+        key = tuple(sorted(manuals))
+        sections = self._manual_sections.get(key)
+        if sections is None:
+            mask = np.zeros(self.index.ntotal, dtype=bool)
+            mask[self.manual_ids(manuals)] = True
+            sections = np.array([s for s, members in enumerate(self.section_members) if mask[members].any()],
+                                dtype="int64")
+            self._manual_sections[key] = sections
+        return sections
+
+    def _make_writable(self):
+        # a bundle store reads its documents lazily and maps its index read only, copy both into memory
+        reader = self.documents
+        self.documents = list(reader)
+        self.chunk_vectors = None
+        if self.index is not None:
+            # clone_index would keep viewing the mapped file, adding to that fails
+            index = faiss.IndexFlatIP(self.index.d)
+            index.add(self.flat_vectors(self.index).copy())
+            self.index = index
+        reader.close()
+
+    def close(self):
+        """Release the files a loaded store keeps open (lazy documents, memory mapped index)"""
+        close_documents = getattr(self.documents, "close", None)
+        if close_documents is not None:
+            close_documents()
+        # the chunk_vectors view points into the index storage, drop it together with the index
+        self.chunk_vectors = None
+        self.section_index = None
+        self.index = None
+
+    @staticmethod
+    def flat_vectors(index):
+        """
+        The vectors of a flat index as a numpy view on its storage (no copy). Only valid while
+        the index is alive and nothing is added to it.
+        """
+        return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+    @staticmethod
+    def page_key(doc):
+        meta = doc.get("metadata", {})
+        return (meta.get("source_file"), meta.get("source_page"))
+
+    def build_hierarchy(self, section_size=8):
+        """
+        Coarse level of the two-stage search. Chunks are grouped into sections (the "section"
+        metadata when the chunker set one, otherwise runs of consecutive pages of the same file
+        holding about section_size chunks) and every section gets a summary vector, the
+        normalized mean of its chunk vectors, in a small FAISS index. A page is never split
+        across two sections.
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return
+        self.chunk_vectors = self.flat_vectors(self.index)
+        self._manual_sections = {}
+
+        pages = {}
+        for i, doc in enumerate(self.documents):
+            pages.setdefault(self.page_key(doc), []).append(i)
+
+        sections = {}
+        current = {}   # source_file -> key of the page run being filled
+        for (source_file, source_page), members in pages.items():
+            section = self.documents[members[0]].get("metadata", {}).get("section")
+            if section is not None:
+                key = (source_file, "section", section)
+            else:
+                key = current.get(source_file)
+                if key is None or len(sections[key]) >= section_size:
+                    key = (source_file, "pages", source_page)
+                    current[source_file] = key
+            sections.setdefault(key, []).extend(members)
+        self.section_members = [np.array(members, dtype="int64") for members in sections.values()]
+
+        section_vectors = np.stack([self.chunk_vectors[m].mean(axis=0) for m in self.section_members]).astype("float32")
+        faiss.normalize_L2(section_vectors)
+        self.section_index = faiss.IndexFlatIP(self.index.d)
+        self.section_index.add(section_vectors)
+        print(f"Section index built: {len(self.section_members)} sections over {self.index.ntotal} chunks")
+
     # step 2 --> save index and docs
-    def save(self, save_dir="faiss_store"):
+    def save(self, save_dir="faiss_store", keep_snapshots=3):
+        """
+        Save as a new versioned snapshot: everything is written to a fresh directory under
+        save_dir/snapshots and only then the CURRENT pointer is swapped to it, so a reader
+        never sees a half written store.
+        """
         if self.index is None:
             print("No index to save.")
             return
         
-        os.makedirs(save_dir, exist_ok=True)
-        faiss.write_index(self.index, os.path.join(save_dir, "index.bin"))
+        snapshots_dir = os.path.join(save_dir, SNAPSHOT_DIR)
+        os.makedirs(snapshots_dir, exist_ok=True)
+
+        version = self.new_version()
+        tmp_dir = os.path.join(snapshots_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+
+        faiss.write_index(self.index, os.path.join(tmp_dir, "index.bin"))
         
-        with open(os.path.join(save_dir, "documents.pkl"), "wb") as f:
-            pickle.dump(self.documents, f)
-        print(f"Index and documents saved to {save_dir}")
+        with open(os.path.join(tmp_dir, "documents.pkl"), "wb") as f:
+            pickle.dump(list(self.documents), f)
+
+        # section level index for the two-stage search
+        if self.section_index is None:
+            self.build_hierarchy()
+        faiss.write_index(self.section_index, os.path.join(tmp_dir, "sections.bin"))
+        with open(os.path.join(tmp_dir, "section_members.pkl"), "wb") as f:
+            pickle.dump(self.section_members, f)
+
+        # publish: rename the finished snapshot, then atomically replace the pointer
+        os.rename(tmp_dir, os.path.join(snapshots_dir, version))
+        self.publish(save_dir, version)
+        self.version = version
+        print(f"Index and documents saved to {save_dir} (snapshot {version})")
+
+        self.prune_snapshots(save_dir, keep=keep_snapshots)
+
+    @staticmethod
+    def new_version():
+        # sortable by time (down to the microsecond), random suffix in case two writers collide
+        now = time.time()
+        return time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:6]}"
+
+    @staticmethod
+    def publish(save_dir, version):
+        """Point CURRENT at save_dir/snapshots/<version> (atomic replace, readers see old or new)"""
+        pointer_tmp = os.path.join(save_dir, f".{CURRENT_POINTER}.{os.getpid()}.tmp")
+        with open(pointer_tmp, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(save_dir, CURRENT_POINTER))
+
+    @staticmethod
+    def current_version(save_dir="faiss_store"):
+        """Version named by the CURRENT pointer, None for an old flat store (or no store)"""
+        try:
+            with open(os.path.join(save_dir, CURRENT_POINTER)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def exists(save_dir="faiss_store"):
+        return (VectorDB.current_version(save_dir) is not None
+                or os.path.exists(os.path.join(save_dir, "index.bin")))
+
+    @staticmethod
+    def prune_snapshots(save_dir="faiss_store", keep=3):
+        # keep the newest few so workers still loading an older one are not broken
+        snapshots_dir = os.path.join(save_dir, SNAPSHOT_DIR)
+        current = VectorDB.current_version(save_dir)
+        versions = sorted(v for v in os.listdir(snapshots_dir) if not v.startswith("."))
+        for version in versions[:-keep]:
+            if version != current:
+                shutil.rmtree(os.path.join(snapshots_dir, version), ignore_errors=True)
 
     # step 3 --> load index and docs for searching
     @classmethod
-    def load(cls, save_dir="faiss_store", model_name="all-MiniLM-L6-v2"):
-        db = cls(model_name=model_name)
-        db.index = faiss.read_index(os.path.join(save_dir, "index.bin"))
+    def load(cls, save_dir="faiss_store", model_name="all-MiniLM-L6-v2", model=None):
+        version = cls.current_version(save_dir)
+        # old stores keep index.bin/documents.pkl directly in save_dir
+        load_dir = os.path.join(save_dir, SNAPSHOT_DIR, version) if version else save_dir
+
+        db = cls(model_name=model_name, model=model)
+        db.index = faiss.read_index(os.path.join(load_dir, "index.bin"))
         
-        with open(os.path.join(save_dir, "documents.pkl"), "rb") as f:
+        with open(os.path.join(load_dir, "documents.pkl"), "rb") as f:
             db.documents = pickle.load(f)
             
         db.dim = db.index.d
-        print(f"Index and documents loaded from {save_dir}")
+        db.version = version
+
+        sections_path = os.path.join(load_dir, "sections.bin")
+        if os.path.exists(sections_path):
+            db.section_index = faiss.read_index(sections_path)
+            with open(os.path.join(load_dir, "section_members.pkl"), "rb") as f:
+                db.section_members = pickle.load(f)
+            db.chunk_vectors = cls.flat_vectors(db.index)
+        else:
+            # older snapshot without a section index, build it now rather than during a search
+            db.build_hierarchy()
+        print(f"Index and documents loaded from {load_dir}")
         print(f"{len(db.documents)} documents in index with {db.index.ntotal} vectors.")
         return db
 
     # step 4 --> search on the index
-    def search(self, query, k=2, threshold=0.3):
+    def search(self, query, k=2, threshold=0.3, hierarchical=False, top_sections=None, max_per_page=2, manuals=None,
+               stats=None):
         if self.index is None:
             print("Index not loaded.")
             return []
         
         # embed the query
-        query_embeddings = self.model.encode([query], normalize_embeddings=True)
-        # search for top 2 matches (will increase when real docs are added)
-        D, I = self.index.search(np.array(query_embeddings).astype("float32"), k=k)
+        query_embedding = self.embed(query)
+        return self.search_by_vector(query_embedding, k=k, threshold=threshold, query=query,
+                                     hierarchical=hierarchical, top_sections=top_sections, max_per_page=max_per_page,
+                                     manuals=manuals, stats=stats)
+
+    def embed(self, query):
+        """Embed a single query, normalized so dot product = cosine similarity"""
+        return self.model.encode([query], normalize_embeddings=True)[0].astype("float32")
+
+    def search_by_vector(self, query_embedding, k=2, threshold=0.3, query=None,
+                         hierarchical=False, top_sections=None, max_per_page=2, manuals=None, stats=None):
+        """
+        Same as search() but with an already embedded query (lets callers reuse the embedding).
+        hierarchical=True first picks the top_sections best sections (default about k/2) and
+        then only ranks their chunks, with at most max_per_page chunks from the same page.
+        manuals restricts the search to the chunks of those manuals (the top-k is taken inside
+        them, a manual with weaker matches still gets its k results).
+        stats: optional dict, filled with what this search scored (one per call, searches run
+        concurrently so the db itself keeps no "last search").
+        """
+        if self.index is None:
+            print("Index not loaded.")
+            return []
+
+        allowed = self.manual_ids(manuals) if manuals is not None else None
+        if allowed is not None and len(allowed) == 0:
+            return []
+
+        if stats is None:
+            stats = {}
+        if hierarchical:
+            ids, scores = self._search_hierarchical(query_embedding, k, top_sections or max(1, (k + 1) // 2), max_per_page,
+                                                    manuals, stats)
+        else:
+            # search for top 2 matches (will increase when real docs are added)
+            params = None
+            if allowed is not None:
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed))
+            D, I = self.index.search(np.array([query_embedding]).astype("float32"), k=k, params=params)
+            ids, scores = I[0], D[0]
+            stats.update(mode="flat", vectors_scored=self.index.ntotal if allowed is None else len(allowed))
 
         results = []
         
         print(f"\nQuery: {query}\n")
         
-        for idx, score in zip(I[0], D[0]):
+        for idx, score in zip(ids, scores):
+            if idx < 0:
+                continue
             if score < threshold:
                 print(f"[Score {score:.4f}] No relevant documents found.\n")
                 continue
             
-            doc = self.documents[idx]
-            result = {
-                "score": score,
-                "text": doc["text"],
-                "metadata": doc["metadata"]
-            }
-            
+            result = self._make_result(idx, score)
             results.append(result)
             
-            meta = doc.get("metadata", {})
-            src = meta.get("source_file", "unknown source")
-            page = meta.get("source_page", "unknown page")
+            src = result["metadata"].get("source_file", "unknown source")
+            page = result["metadata"].get("source_page", "unknown page")
             print(f"[Score {score:.4f}] From {src}, page {page}")
-            print(f"   {doc['text'][:200]}\n")
+            print(f"   {result['text'][:200]}\n")
             
             # print(f"[Score {score:.4f}] {doc['metadata']}")
             # print(f"   {doc['text']}\n")
@@ -109,9 +343,71 @@ class VectorDB:
                 print("No relevant documents found.\n")
                 
         return results
+
+    def _search_hierarchical(self, query_embedding, k, top_sections, max_per_page, manuals, stats):
+        if self.section_index is None:
+            self.build_hierarchy()
+
+        # stage 1: best sections by their summary vector, only among the sections of the
+        # manuals asked for (a manual whose sections rank low overall still gets its best ones)
+        query = np.array([query_embedding]).astype("float32")
+        params = None
+        n_sections = self.section_index.ntotal
+        if manuals is not None:
+            allowed_sections = self.manual_sections(manuals)
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed_sections))
+            n_sections = len(allowed_sections)
+        _, section_ids = self.section_index.search(query, min(top_sections, n_sections), params=params)
+        section_ids = [s for s in section_ids[0] if s >= 0]
+        if not section_ids:
+            return [], []
+
+        # stage 2: score only the chunks of those sections (a section can mix manuals when
+        # several files share one, keep the manuals' own chunks)
+        candidates = np.concatenate([self.section_members[s] for s in section_ids])
+        if manuals is not None:
+            candidates = candidates[np.isin(candidates, self.manual_ids(manuals))]
+        candidate_scores = self.chunk_vectors[candidates] @ query[0]
+
+        ids, scores = [], []
+        per_page = {}
+        for i in np.argsort(-candidate_scores):
+            idx = int(candidates[i])
+            page = self.page_key(self.documents[idx])
+            # cap the chunks per page so the top-k isn't three fragments of one page
+            if per_page.get(page, 0) >= max_per_page:
+                continue
+            per_page[page] = per_page.get(page, 0) + 1
+            ids.append(idx)
+            scores.append(float(candidate_scores[i]))
+            if len(ids) >= k:
+                break
+
+        stats.update(mode="hierarchical", vectors_scored=n_sections + len(candidates), sections_searched=len(section_ids))
+        return ids, scores
+
+    def get_results(self, indices, scores=None):
+        """Build search-style results for documents by their position in the index"""
+        if scores is None:
+            scores = [None] * len(indices)
+        return [self._make_result(idx, score) for idx, score in zip(indices, scores)]
+
+    def _make_result(self, idx, score):
+        doc = self.documents[idx]
+        return {
+            "score": score,
+            "text": doc["text"],
+            "metadata": doc["metadata"],
+            "index": int(idx)
+        }
     
     def clear(self):
         self.index = None
         self.documents = []
         self.dim = None
+        self.section_index = None
+        self.section_members = []
+        self.chunk_vectors = None
+        self._manual_ids = {}
+        self._manual_sections = {}
         print("Cleared the vector database.")
\ No newline at end of file
@@ -0,0 +1,288 @@
+"""
+Line-delimited artifact format for the ingestion outputs (*_processed / *_chunked).
+
+Each artifact is a .jsonl file:
+    line 1      header record  {"format": "franke-artifact", "version": 1, "kind": ..., ...}
+    line 2..n   one record per page (processed) or per chunk (chunked)
+
+next to it a small <name>.jsonl.idx file holds the byte offset of every record and a
+summary written when the file is closed (e.g. chunk stats). With the offsets a reader can
+jump straight to record i or stream the records one by one without loading the whole
+file, which is what we need to rebuild a VectorDB from hundreds of manuals.
+
+usage:
+    python retrieval_backbone/artifacts.py convert data/processed/*.json
+    python retrieval_backbone/artifacts.py build-index data/processed --save-dir faiss_store
+    (add --profile before the command to write cProfile/flamegraph files to profiles/)
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+
+FORMAT_NAME = "franke-artifact"
+FORMAT_VERSION = 1
+KNOWN_MANUALS = ["A1000", "A300", "A600", "S700"]
+
+
+def index_path_for(path):
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+
+class ArtifactWriter:
+    """Streams records to a .jsonl artifact, the header goes first and the index is written on close"""
+    def __init__(self, path, kind, header=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.offsets = []
+        # write next to the final name and rename on close, readers never see half a file
+        self._tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        index_path = index_path_for(self.path)
+        self._tmp_index_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._write_line({"format": FORMAT_NAME, "version": FORMAT_VERSION, "kind": kind, **(header or {})})
+
+    def _write_line(self, obj):
+        self._file.write(json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def write(self, record):
+        self.offsets.append(self._file.tell())
+        self._write_line(record)
+
+    def close(self, summary=None):
+        if self._file.closed:
+            return
+        self._file.close()
+        index = {"version": FORMAT_VERSION, "count": len(self.offsets), "offsets": self.offsets, "summary": summary or {}}
+        with open(self._tmp_index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(self._tmp_path, self.path)
+        os.replace(self._tmp_index_path, index_path_for(self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # don't publish a partial artifact (and leave no temp files behind)
+            self._file.close()
+            for tmp_path in (self._tmp_path, self._tmp_index_path):
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+
+class ArtifactReader:
+    """Lazy reader: only the header and the offsets are loaded, records are read on demand"""
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.header = json.loads(f.readline())
+            data_start = f.tell()
+        if self.header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{self.path} is not a {FORMAT_NAME} file")
+
+        index_path = index_path_for(self.path)
+        if index_path.exists():
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.offsets = index["offsets"]
+            self.summary = index.get("summary", {})
+        else:
+            # no index (copied without it?), rebuild the offsets with one scan
+            self.offsets = self._scan_offsets(data_start)
+            self.summary = {}
+        self._file = None
+        # random access shares one file handle, searches on several threads read through it
+        self._lock = threading.Lock()
+
+    def _scan_offsets(self, start):
+        offsets = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    offsets.append(pos)
+        return offsets
+
+    @property
+    def kind(self):
+        return self.header.get("kind")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.offsets)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "rb")
+            self._file.seek(self.offsets[i])
+            line = self._file.readline()
+        return json.loads(line)
+
+    def __iter__(self):
+        # sequential streaming read, one record in memory at a time
+        with open(self.path, "rb") as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def write_processed(path, processed_result):
+    """Write the output of FrankePDFProcessor.extract_text_and_metadata as an artifact"""
+    header = {
+        "file_name": processed_result["file_name"],
+        "total_pages": processed_result["total_pages"],
+        "metadata": processed_result.get("metadata", {}),
+        "images": processed_result.get("images", []),
+        "toc": processed_result.get("toc", []),
+    }
+    with ArtifactWriter(path, "processed", header) as writer:
+        for page in processed_result["text_content"]:
+            writer.write(page)
+
+
+def write_chunked(path, chunked_result):
+    """Write the output of FrankePDFProcessor.chunk_document as an artifact"""
+    header = {
+        "file_name": chunked_result["file_name"],
+        "total_pages": chunked_result["total_pages"],
+    }
+    with ArtifactWriter(path, "chunked", header) as writer:
+        for chunk in chunked_result["chunks"]:
+            writer.write(chunk)
+        writer.close(summary={
+            "total_chunks": chunked_result["total_chunks"],
+            "chunk_stats": chunked_result["chunk_stats"],
+        })
+
+
+def detect_manual_name(file_name):
+    #try to extract the model name (like "A1000") from the file name
+    for manual in KNOWN_MANUALS:
+        if manual in file_name:
+            return manual
+    return "Unknown"
+
+
+def chunk_to_vector_doc(file_name, chunk):
+    """Turn a chunk record into the {text, metadata} document the VectorDB stores"""
+    doc = {
+        "text": chunk["text"],
+        "metadata": {
+            "source_file": file_name,
+            "manual": detect_manual_name(file_name),
+            "source_page": chunk["metadata"]["source_page"],
+            "chunk_id": chunk["metadata"]["chunk_id"],
+            "images": chunk["metadata"].get("images", [])
+        }
+    }
+    # set by the section-aware chunker (section is what the two-stage search groups by)
+    for key in ("pages", "section", "heading", "headings"):
+        if chunk["metadata"].get(key) is not None:
+            doc["metadata"][key] = chunk["metadata"][key]
+    return doc
+
+
+def iter_vector_docs(chunked_paths):
+    """Stream VectorDB documents out of chunked artifacts"""
+    for path in chunked_paths:
+        reader = ArtifactReader(path)
+        if reader.kind != "chunked":
+            continue
+        file_name = reader.header["file_name"]
+        for chunk in reader:
+            yield chunk_to_vector_doc(file_name, chunk)
+
+
+def build_vectordb(chunked_paths, db=None, batch_size=256):
+    """Rebuild a VectorDB straight from chunked artifacts, no PDF parsing, embedding in batches"""
+    from VectorDB import VectorDB
+
+    if db is None:
+        db = VectorDB()
+    batch = []
+    for doc in iter_vector_docs(chunked_paths):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            db.add_documents(batch)
+            batch = []
+    if batch:
+        db.add_documents(batch)
+    return db
+
+
+def convert_json(json_path, out_path=None):
+    """Convert an old *_processed.json / *_chunked.json file into the artifact format"""
+    json_path = Path(json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if out_path is None:
+        out_path = json_path.with_suffix(".jsonl")
+    if "text_content" in data:
+        write_processed(out_path, data)
+    elif "chunks" in data:
+        write_chunked(out_path, data)
+    else:
+        raise ValueError(f"{json_path} is neither a processed nor a chunked file")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and load ingestion artifacts")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile + stack sampling, writes .prof/.folded files to profiles/")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="convert old JSON outputs to .jsonl artifacts")
+    convert_parser.add_argument("files", nargs="+")
+
+    build_parser = subparsers.add_parser("build-index", help="rebuild the FAISS store from chunked artifacts")
+    build_parser.add_argument("artifact_dir")
+    build_parser.add_argument("--save-dir", default="faiss_store")
+
+    args = parser.parse_args()
+
+    if args.profile:
+        project_root = Path(__file__).resolve().parents[1]
+        sys.path.append(str(project_root))
+        from profiling import profile_call
+
+        stages = {"Reading artifacts": "iter_vector_docs", "Embedding + index": "add_documents"}
+        profile_call(lambda: run_command(args), output_dir=project_root / "profiles", prefix="artifacts", stages=stages)
+    else:
+        run_command(args)
+
+
+def run_command(args):
+    if args.command == "convert":
+        for file in args.files:
+            out_path = convert_json(file)
+            print(f"{file} -> {out_path}")
+    elif args.command == "build-index":
+        paths = sorted(Path(args.artifact_dir).glob("*_chunked.jsonl"))
+        print(f"Building FAISS store from {len(paths)} chunked artifacts")
+        db = build_vectordb(paths)
+        db.save(save_dir=args.save_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Chunk count and index size of the section-aware chunker vs the old page-by-page chunks.
+
+Rechunks the page texts of every *_processed.json(l) in data/processed (no PDF or OCR
+needed) and compares the result with the shipped *_chunked.json files, which were made by
+the page-by-page chunker with the hard-coded header regexes. The two changes are reported
+separately:
+    cleaned     still page by page, but repeated headers/footers removed and duplicate
+                chunks dropped (what the embedded text loses)
+    sections    section-aware chunks, small sections of a chapter packed together (fewer,
+                larger chunks, the text is about the same)
+The index size is what the FAISS store would take: one float32 vector per chunk plus the
+pickled documents.
+
+usage: python retrieval_backbone/benchmark_chunking.py [--processed-dir data/processed]
+"""
+
+import argparse
+import json
+import pickle
+import sys
+from pathlib import Path
+
+THIS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = THIS_DIR.parent
+sys.path.append(str(THIS_DIR))
+
+from franke_processor_regex import FrankePDFProcessor
+from artifacts import ArtifactReader, chunk_to_vector_doc
+
+
+# all-MiniLM-L6-v2, the model VectorDB uses
+EMBEDDING_DIM = 384
+
+
+def load_processed(path):
+    if path.suffix == ".jsonl":
+        reader = ArtifactReader(path)
+        return {**reader.header, "text_content": list(reader)}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_chunked(path):
+    if path.suffix == ".jsonl":
+        reader = ArtifactReader(path)
+        return {**reader.header, "chunks": list(reader)}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_size(file_name, chunks):
+    docs = [chunk_to_vector_doc(file_name, chunk) for chunk in chunks]
+    return len(chunks) * EMBEDDING_DIM * 4 + len(pickle.dumps(docs))
+
+
+def summarize(file_name, chunks):
+    return {
+        "chunks": len(chunks),
+        "tokens": sum(c.get("token_count", 0) for c in chunks),
+        "bytes": index_size(file_name, chunks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the section-aware chunker with the shipped chunks")
+    parser.add_argument("--processed-dir", default=str(PROJECT_ROOT / "data" / "processed"))
+    parser.add_argument("--target-tokens", type=int, default=400)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    processors = {
+        "cleaned": FrankePDFProcessor(target_tokens=args.target_tokens, overlap_tokens=args.overlap_tokens,
+                                      structure_aware=False),
+        "sections": FrankePDFProcessor(target_tokens=args.target_tokens, overlap_tokens=args.overlap_tokens),
+    }
+    columns = ["shipped"] + list(processors)
+    totals = {column: {"chunks": 0, "tokens": 0, "bytes": 0} for column in columns}
+
+    processed_dir = Path(args.processed_dir)
+    for processed_path in sorted(processed_dir.glob("*_processed.json*")):
+        if processed_path.suffix not in (".json", ".jsonl"):
+            continue
+        stem = processed_path.name.split("_processed")[0]
+        chunked_path = next((p for p in [processed_dir / f"{stem}_chunked.json", processed_dir / f"{stem}_chunked.jsonl"]
+                             if p.exists()), None)
+        if chunked_path is None:
+            print(f"{processed_path.name}: no chunked file to compare with, skipped")
+            continue
+
+        processed = load_processed(processed_path)
+        row = {"shipped": summarize(processed["file_name"], load_chunked(chunked_path)["chunks"])}
+        for name, processor in processors.items():
+            result = processor.chunk_document(processed)
+            row[name] = summarize(processed["file_name"], result["chunks"])
+            row[name]["stats"] = result["chunk_stats"]
+        for column in columns:
+            for key in totals[column]:
+                totals[column][key] += row[column][key]
+
+        stats = row["sections"]["stats"]
+        print(f"\n{processed['file_name']} ({processed['total_pages']} pages)")
+        print_table(row, columns)
+        print(f"  header/footer lines removed: {stats['boilerplate_lines']}, duplicate chunks dropped: {stats['duplicate_chunks']}")
+
+    shipped = totals["shipped"]
+    if shipped["chunks"]:
+        print("\nAll manuals")
+        print_table(totals, columns)
+        for column in processors:
+            new = totals[column]
+            print(f"  {column:9s} vs shipped: {(1 - new['chunks'] / shipped['chunks']) * 100:4.0f}% fewer chunks,"
+                  f" {(1 - new['tokens'] / shipped['tokens']) * 100:4.1f}% fewer tokens,"
+                  f" {(1 - new['bytes'] / shipped['bytes']) * 100:4.0f}% smaller index")
+
+
+def print_table(row, columns):
+    print("              " + "".join(f"{column:>10s}" for column in columns))
+    print("  chunks      " + "".join(f"{row[c]['chunks']:10d}" for c in columns))
+    print("  tokens      " + "".join(f"{row[c]['tokens']:10d}" for c in columns))
+    print("  index KB    " + "".join(f"{row[c]['bytes'] / 1024:10.0f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark for the two-stage (section -> chunk) search against the flat search.
+
+Loads the FAISS store (or builds one in memory from the *_chunked.json files in
+data/processed) and runs the same queries through both searches. Reports per query
+latency, how many vectors were scored, recall@k of the hierarchical results against the
+flat top-k and how many different pages the top-k came from.
+
+usage: python retrieval_backbone/benchmark_hierarchical.py [--k 5] [--runs 20] [--from-json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from retrieval_backbone.VectorDB import VectorDB
+from retrieval_backbone.artifacts import chunk_to_vector_doc
+from config import FAISS_STORE_DIR
+
+
+QUERIES = [
+    "How do I clean the milk system?",
+    "What does the error message 'Grinder blocked' mean?",
+    "How do I descale the coffee machine?",
+    "How do I change the water filter?",
+    "What is the recommended grind setting for espresso?",
+    "How do I switch the machine off for a long period?",
+    "Which cleaning tablets should be used?",
+    "How do I set the milk temperature?",
+    "What should I do when the steam wand is blocked?",
+    "How often does the brewing unit need to be cleaned?",
+]
+
+
+def build_from_json(processed_dir):
+    db = VectorDB()
+    for path in sorted(Path(processed_dir).glob("*_chunked.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        db.add_documents([chunk_to_vector_doc(data["file_name"], chunk) for chunk in data["chunks"]])
+    return db
+
+
+def timed_search(db, embedding, k, runs, **options):
+    timings = []
+    stats = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = db.search_by_vector(embedding, k=k, threshold=0.0, stats=stats, **options)
+        timings.append(time.perf_counter() - start)
+    return results, statistics.median(timings), stats
+
+
+def distinct_pages(results):
+    return len({VectorDB.page_key(r) for r in results})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare flat and hierarchical FAISS search")
+    parser.add_argument("--k", type=int, default=5, help="chunks returned per query")
+    parser.add_argument("--top-sections", type=int, default=None, help="sections kept by the first stage (default about k/2)")
+    parser.add_argument("--max-per-page", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=20, help="timed runs per query")
+    parser.add_argument("--store", default=str(PROJECT_ROOT / FAISS_STORE_DIR))
+    parser.add_argument("--from-json", action="store_true", help="build the index from data/processed instead of loading the store")
+    args = parser.parse_args()
+
+    if args.from_json or not VectorDB.exists(args.store):
+        db = build_from_json(PROJECT_ROOT / "data" / "processed")
+    else:
+        db = VectorDB.load(args.store)
+    if db.section_index is None:
+        db.build_hierarchy()
+
+    # search_by_vector prints every hit, keep the report readable
+    real_stdout = sys.stdout
+    rows = []
+    for query in QUERIES:
+        embedding = db.embed(query)
+        sys.stdout = open(os.devnull, "w")
+        try:
+            flat, flat_time, flat_stats = timed_search(db, embedding, args.k, args.runs, hierarchical=False)
+            hier, hier_time, hier_stats = timed_search(
+                db, embedding, args.k, args.runs,
+                hierarchical=True, top_sections=args.top_sections, max_per_page=args.max_per_page
+            )
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+        flat_ids = {r["index"] for r in flat}
+        recall = len(flat_ids & {r["index"] for r in hier}) / len(flat_ids) if flat_ids else 1.0
+        rows.append({
+            "flat_ms": flat_time * 1000,
+            "hier_ms": hier_time * 1000,
+            "flat_scored": flat_stats["vectors_scored"],
+            "hier_scored": hier_stats["vectors_scored"],
+            "recall": recall,
+            "flat_pages": distinct_pages(flat),
+            "hier_pages": distinct_pages(hier),
+        })
+
+    print(f"\n{db.index.ntotal} chunks in {len(db.section_members)} sections, k={args.k}, {len(QUERIES)} queries\n")
+    print(f"{'':14s} {'latency (ms)':>13s} {'vectors scored':>15s} {'pages in top-k':>15s}")
+    for label, prefix in [("flat", "flat"), ("hierarchical", "hier")]:
+        print(f"{label:14s} {statistics.mean(r[prefix + '_ms'] for r in rows):13.3f}"
+              f" {statistics.mean(r[prefix + '_scored'] for r in rows):15.0f}"
+              f" {statistics.mean(r[prefix + '_pages'] for r in rows):15.1f}")
+    print(f"\nrecall@{args.k} of hierarchical vs flat: {statistics.mean(r['recall'] for r in rows):.2f}"
+          f" (min {min(r['recall'] for r in rows):.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Offline bundle: everything a store needs to answer questions without network access, in
+one versioned and checksummed tar file.
+
+    manifest.json              format/version, sha256 + size of every other file, model info
+    index.bin                  FAISS chunk index (memory mapped on load)
+    sections.bin               section index of the two-stage search
+    section_members.pkl
+    documents.jsonl(.idx)      the chunk documents as an artifact, read lazily by offset
+    model/                     SentenceTransformer weights (optionally stored as fp16)
+    config.json                the retrieval settings the bundle was exported with
+
+The LLM is not part of a bundle. Serving one needs a local LLM_BACKEND ("ollama", or "mock" for
+load tests), the API refuses to start with the hosted Mistral API.
+
+`import` extracts a bundle next to the previous ones (bundles/snapshots/<id>) and moves the
+CURRENT pointer, the same layout as a FAISS store, so a running API hot reloads it. Set
+OFFLINE_BUNDLE_DIR (and LLM_BACKEND = "ollama") in config.py to serve from it.
+
+usage:
+    python retrieval_backbone/bundle.py export --store faiss_store --out franke.bundle.tar [--fp16]
+    python retrieval_backbone/bundle.py import franke.bundle.tar --dest bundles
+    python retrieval_backbone/bundle.py inspect bundles
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from retrieval_backbone.VectorDB import VectorDB, SNAPSHOT_DIR
+from retrieval_backbone.artifacts import ArtifactReader, ArtifactWriter
+from config import FAISS_STORE_DIR
+
+
+BUNDLE_FORMAT = "franke-bundle"
+BUNDLE_VERSION = 1
+MANIFEST = "manifest.json"
+
+# settings copied into the bundle -> VectorDB.search_by_vector option they become on load
+BUNDLE_SEARCH_OPTIONS = {
+    "RETRIEVAL_HIERARCHICAL": "hierarchical",
+    "RETRIEVAL_TOP_SECTIONS": "top_sections",
+    "RETRIEVAL_MAX_PER_PAGE": "max_per_page",
+}
+# LLM backends that work without network access
+LOCAL_LLM_BACKENDS = ("ollama", "mock")
+
+# map the flat index instead of reading it (IO_FLAG_MMAP_IFC on faiss >= 1.8)
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def checksum_files(root):
+    files = {}
+    for path in sorted(Path(root).rglob("*")):
+        if path.is_file() and path.name != MANIFEST:
+            files[path.relative_to(root).as_posix()] = {"sha256": file_sha256(path), "bytes": path.stat().st_size}
+    return files
+
+
+def bundle_config():
+    import config
+    return {key: getattr(config, key) for key in BUNDLE_SEARCH_OPTIONS if hasattr(config, key)}
+
+
+def check_llm_backend(backend):
+    """A bundle is served offline, the answers can't come from the hosted API"""
+    if backend not in LOCAL_LLM_BACKENDS:
+        raise ValueError(f'LLM_BACKEND = "{backend}" needs network access, serving an offline bundle needs one of '
+                         f'{", ".join(LOCAL_LLM_BACKENDS)}')
+
+
+def export_bundle(store_dir, out_path, fp16=False, model=None):
+    """Pack the published store, the embedding model and the settings into one tar file"""
+    db = VectorDB.load(save_dir=store_dir, model=model)
+    if db.section_index is None:
+        db.build_hierarchy()
+    bundle_id = VectorDB.new_version()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        faiss.write_index(db.index, os.path.join(tmp, "index.bin"))
+        faiss.write_index(db.section_index, os.path.join(tmp, "sections.bin"))
+        with open(os.path.join(tmp, "section_members.pkl"), "wb") as f:
+            pickle.dump(db.section_members, f)
+
+        # one document per line with an offset index, so loading doesn't unpickle every chunk
+        with ArtifactWriter(os.path.join(tmp, "documents.jsonl"), "documents", {"store_version": db.version}) as writer:
+            for doc in db.documents:
+                writer.write(doc)
+
+        # half precision halves the download, the weights are upcast again on load
+        # (half() converts in place, so on a copy: the caller's encoder stays float32)
+        model = copy.deepcopy(db.model).half() if fp16 else db.model
+        model.save(os.path.join(tmp, "model"))
+
+        with open(os.path.join(tmp, "config.json"), "w", encoding="utf-8") as f:
+            json.dump(bundle_config(), f, indent=2)
+
+        files = checksum_files(tmp)
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "version": BUNDLE_VERSION,
+            "bundle_id": bundle_id,
+            "store_version": db.version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "documents": len(db.documents),
+            "dim": db.dim,
+            "model": {
+                "name": db.model_name,
+                "dtype": "float16" if fp16 else "float32",
+                "checksum": hashlib.sha256(json.dumps(
+                    {k: v["sha256"] for k, v in files.items() if k.startswith("model/")}, sort_keys=True
+                ).encode()).hexdigest(),
+            },
+            "files": files,
+        }
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # manifest first so `inspect` on the tar only has to read its head
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_out = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+        with tarfile.open(tmp_out, "w") as tar:
+            tar.add(os.path.join(tmp, MANIFEST), arcname=MANIFEST)
+            for name in files:
+                tar.add(os.path.join(tmp, name), arcname=name)
+        os.replace(tmp_out, out_path)
+
+    size_mb = out_path.stat().st_size / 1024 / 1024
+    print(f"Bundle {bundle_id} written to {out_path} ({size_mb:.1f} MB, {len(db.documents)} documents)")
+    return manifest
+
+
+def verify_bundle(bundle_dir):
+    """Check the manifest format and every checksum, returns the manifest"""
+    with open(os.path.join(bundle_dir, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"{bundle_dir} is not a {BUNDLE_FORMAT}")
+    if manifest.get("version", 0) > BUNDLE_VERSION:
+        raise ValueError(f"bundle version {manifest['version']} is newer than supported ({BUNDLE_VERSION})")
+    for name, info in manifest["files"].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            raise ValueError(f"bundle file missing: {name}")
+        if file_sha256(path) != info["sha256"]:
+            raise ValueError(f"checksum mismatch: {name}")
+    return manifest
+
+
+def import_bundle(tar_path, dest_dir="bundles", keep=2):
+    """Extract, verify and publish a bundle under dest_dir, a running API picks it up"""
+    snapshots_dir = os.path.join(dest_dir, SNAPSHOT_DIR)
+    os.makedirs(snapshots_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=snapshots_dir)
+    try:
+        with tarfile.open(tar_path, "r") as tar:
+            # the data filter refuses absolute paths, links out of the directory etc.
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp_dir, filter="data")
+            else:
+                tar.extractall(tmp_dir)
+        manifest = verify_bundle(tmp_dir)
+        target = os.path.join(snapshots_dir, manifest["bundle_id"])
+        if os.path.exists(target):
+            shutil.rmtree(tmp_dir)
+        else:
+            os.rename(tmp_dir, target)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    VectorDB.publish(dest_dir, manifest["bundle_id"])
+    VectorDB.prune_snapshots(dest_dir, keep=keep)
+    print(f"Bundle {manifest['bundle_id']} (store {manifest['store_version']}) imported into {dest_dir}")
+    return manifest
+
+
+def search_options(config):
+    """The search settings a bundle was exported with, as search_by_vector keyword arguments"""
+    options = {option: config[key] for key, option in BUNDLE_SEARCH_OPTIONS.items() if key in config}
+    if "top_sections" in options:
+        options["top_sections"] = options["top_sections"] or None   # 0 = about k/2, like config.py
+    return options
+
+
+def check_compatible(manifest, db):
+    """The index, the documents and the model have to match what the manifest says was exported"""
+    problems = []
+    if db.index.d != manifest["dim"]:
+        problems.append(f"index dim {db.index.d} != {manifest['dim']}")
+    if db.section_index.d != manifest["dim"]:
+        problems.append(f"section index dim {db.section_index.d} != {manifest['dim']}")
+    if len(db.documents) != manifest["documents"] or db.index.ntotal != manifest["documents"]:
+        problems.append(f"{len(db.documents)} documents / {db.index.ntotal} vectors, manifest says {manifest['documents']}")
+    model_dim = getattr(db.model, "get_sentence_embedding_dimension", lambda: None)()
+    if model_dim is not None and model_dim != manifest["dim"]:
+        problems.append(f"model {manifest['model']['name']} embeds into {model_dim} dims, the index has {manifest['dim']}")
+    if problems:
+        raise ValueError("bundle does not match its manifest: " + "; ".join(problems))
+
+
+def load_bundle(dest_dir, previous_db=None):
+    """
+    Load the current bundle of dest_dir for searching. The chunk index is memory mapped and
+    the documents are read on demand, so the load cost barely grows with the corpus. The
+    model comes from the bundle (no hub access), or from previous_db when it's the same one.
+    The search settings of config.json become db.search_options.
+    """
+    version = VectorDB.current_version(dest_dir)
+    if version is None:
+        raise FileNotFoundError(f"no bundle imported in {dest_dir}")
+    bundle_dir = os.path.join(dest_dir, SNAPSHOT_DIR, version)
+    with open(os.path.join(bundle_dir, MANIFEST), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(os.path.join(bundle_dir, "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    start = time.perf_counter()
+    model = None
+    if previous_db is not None and getattr(previous_db, "model_checksum", None) == manifest["model"]["checksum"]:
+        model = previous_db.model
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(os.path.join(bundle_dir, "model"), device="cpu").float()
+    model_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db = VectorDB(model_name=manifest["model"]["name"], model=model)
+    db.model_checksum = manifest["model"]["checksum"]
+    db.index = faiss.read_index(os.path.join(bundle_dir, "index.bin"), MMAP_FLAGS)
+    db.dim = db.index.d
+    db.version = version
+    db.documents = ArtifactReader(os.path.join(bundle_dir, "documents.jsonl"))
+
+    db.section_index = faiss.read_index(os.path.join(bundle_dir, "sections.bin"))
+    with open(os.path.join(bundle_dir, "section_members.pkl"), "rb") as f:
+        db.section_members = pickle.load(f)
+    # a view on the mapped index storage instead of a copy (the bundle is read only)
+    db.chunk_vectors = VectorDB.flat_vectors(db.index)
+    try:
+        check_compatible(manifest, db)
+    except ValueError:
+        db.close()
+        raise
+    db.search_options = search_options(config)
+    db.load_timings = {"model_ms": round(model_time * 1000, 1), "store_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    print(f"Bundle {version} loaded from {bundle_dir} ({len(db.documents)} documents)")
+    return db
+
+
+def inspect_bundle(dest_dir):
+    version = VectorDB.current_version(dest_dir)
+    if version is None:
+        print(f"no bundle imported in {dest_dir}")
+        return
+    manifest = verify_bundle(os.path.join(dest_dir, SNAPSHOT_DIR, version))
+    print(json.dumps({k: v for k, v in manifest.items() if k != "files"}, indent=2))
+    print(f"{len(manifest['files'])} files, checksums OK")
+
+    # cold load (the model time is mostly the torch import)
+    db = load_bundle(dest_dir)
+    start = time.perf_counter()
+    db.search_by_vector(db.embed("How do I clean the milk system?"), k=5, **db.search_options)
+    query_time = time.perf_counter() - start
+    print(f"cold load: model {db.load_timings['model_ms']:.0f} ms, index + documents {db.load_timings['store_ms']:.1f} ms,"
+          f" first query {query_time * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import offline bundles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="pack the current FAISS store into a bundle")
+    export_parser.add_argument("--store", default=str(PROJECT_ROOT / FAISS_STORE_DIR))
+    export_parser.add_argument("--out", default="franke.bundle.tar")
+    export_parser.add_argument("--fp16", action="store_true", help="store the encoder weights as float16")
+
+    import_parser = subparsers.add_parser("import", help="verify and publish a bundle")
+    import_parser.add_argument("bundle")
+    import_parser.add_argument("--dest", default="bundles")
+
+    inspect_parser = subparsers.add_parser("inspect", help="verify the current bundle and time a cold load")
+    inspect_parser.add_argument("dest", nargs="?", default="bundles")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_bundle(args.store, args.out, fp16=args.fp16)
+    elif args.command == "import":
+        import_bundle(args.bundle, args.dest)
+    elif args.command == "inspect":
+        inspect_bundle(args.dest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Document structure for the chunker.
+
+    find_repeated_lines / strip_repeated_lines
+        running headers and footers, found by counting which lines come back at the top or
+        bottom of many pages (no per-manual patterns)
+    find_headings
+        section headings from the PDF outline (doc.get_toc()), from font sizes, or as a last
+        resort from numbered heading lines ("7.10" + "Emptying the grounds container")
+    split_sections
+        the page lines cut into sections at those headings, a section can span pages (text
+        before the first heading is the "front matter" section)
+    dedupe_chunks
+        drops chunks whose text (ignoring case, numbers and punctuation) was already seen
+"""
+
+import hashlib
+import re
+from collections import Counter
+
+
+EDGE_LINES = 4
+MIN_REPEATS = 3
+
+# "– yes" / "• Rinse" are list items, even when one comes back at the bottom of many pages
+LIST_ITEM = re.compile(r'^[–•*-]\s')
+NUMBER_LINE = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,3})$')
+NUMBERED_TITLE = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){0,3})\s+([A-Z].*)$')
+MAX_TITLE_LENGTH = 80
+# chapter / heading of the text before the first heading (cover, legal notes, contents)
+FRONT_MATTER = 'front matter'
+HEADING_SEPARATOR = ' > '
+
+
+def normalize_line(line):
+    # numbers become # so "Filling and emptying | 7" and page numbers match on every page
+    line = re.sub(r'\d+', '#', line.strip().lower())
+    return re.sub(r'\s+', ' ', line)
+
+
+def is_page_number(line, page):
+    # bare number close to the page index, a chapter number ("2" above a chapter title) is not
+    line = line.strip()
+    return line.isdigit() and abs(int(line) - page) <= 5
+
+
+def page_lines(text):
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def is_running_header(normalized):
+    # needs words: without letters it's a section or part number ("#.#", "#.#.#"), page numbers
+    # are handled by is_page_number; a list item or a lone word fragment ("chine.") isn't one either
+    return bool(re.search(r'[^\W\d_]', normalized)) and not LIST_ITEM.match(normalized) and len(normalized.split()) > 1
+
+
+def find_repeated_lines(pages, edge_lines=EDGE_LINES, min_repeats=MIN_REPEATS):
+    """Normalized lines that show up within edge_lines of the top or bottom of min_repeats pages"""
+    counts = Counter()
+    for page in pages:
+        lines = page['lines']
+        counts.update({normalize_line(line) for line in lines[:edge_lines] + lines[-edge_lines:]})
+    return {line for line, count in counts.items() if count >= min_repeats and is_running_header(line)}
+
+
+def strip_repeated_lines(lines, repeated, page, edge_lines=EDGE_LINES, keep=()):
+    """
+    Remove the repeated lines and the page number from the top and bottom of one page.
+    keep holds normalized lines that stay anyway (the headings of the page).
+    """
+    def boilerplate(line):
+        normalized = normalize_line(line)
+        return normalized not in keep and (normalized in repeated or is_page_number(line, page))
+
+    top = min(edge_lines, len(lines))
+    bottom = max(top, len(lines) - edge_lines)
+    kept = [line for line in lines[:top] if not boilerplate(line)]
+    kept += lines[top:bottom]
+    kept += [line for line in lines[bottom:] if not boilerplate(line)]
+    return kept
+
+
+def _title_matches(line, title):
+    line, title = normalize_line(line), normalize_line(title)
+    return line == title or (len(line) > 10 and title.startswith(line))
+
+
+def _match_headings(pages, entries, keep_unmatched):
+    # entries: {page: [(level, title)]}, find the line of each title on its page. A title that
+    # isn't found starts its section at the top of the page (keep_unmatched) or is dropped
+    headings = {}
+    for page in pages:
+        marks = []
+        start = 0
+        for level, title in entries.get(page['page'], []):
+            index = next((i for i in range(start, len(page['lines'])) if _title_matches(page['lines'][i], title)), None)
+            if index is None:
+                if keep_unmatched:
+                    marks.append((start, 0, level, title))
+            else:
+                marks.append((index, 1, level, title))
+                start = index + 1
+        if marks:
+            headings[page['page']] = marks
+    return headings
+
+
+def _next_numbers(previous):
+    # the heading numbers that may follow `previous`: first child, or next sibling at any level
+    if previous is None:
+        return None
+    allowed = {previous + (1,)}
+    for level in range(len(previous)):
+        allowed.add(previous[:level] + (previous[level] + 1,))
+    return allowed
+
+
+def _numbered_headings(pages):
+    headings = {}
+    previous = None
+    for page in pages:
+        lines = page['lines']
+        marks = []
+        for i, line in enumerate(lines):
+            match = NUMBER_LINE.match(line)
+            if match and i + 1 < len(lines):
+                title, consumed = lines[i + 1], 2
+                # a table of contents line is followed by its page number, a heading is not
+                if i + 2 < len(lines) and lines[i + 2].isdigit():
+                    continue
+            else:
+                match = NUMBERED_TITLE.match(line)
+                if not match:
+                    continue
+                title, consumed = match.group(2), 1
+            # "Cleaning the aerator", "5-step method", not "on the operator panel." or "2"
+            if not re.match(r'[A-Z]|\d+-?[A-Za-z]', title) or not 3 <= len(title) <= MAX_TITLE_LENGTH:
+                continue
+
+            number = tuple(int(n) for n in match.group(1).split('.'))
+            # chapters start on a new page, a "16" halfway down a page is a table row
+            if len(number) == 1 and i > 2:
+                continue
+            allowed = _next_numbers(previous)
+            # numbers have to continue the outline, this filters out table cells and step lists
+            if (allowed is None and len(number) != 1) or (allowed is not None and number not in allowed):
+                continue
+            previous = number
+            marks.append((i, consumed, len(number), f"{match.group(1)} {title}"))
+        if marks:
+            headings[page['page']] = marks
+    return headings
+
+
+def find_headings(pages, toc=None):
+    """
+    Headings per page as (line index, lines it takes up, level, title). Uses the PDF outline
+    when there is one, then the headings found by font size, then numbered heading lines.
+    """
+    if toc:
+        entries = {}
+        for level, title, page in toc:
+            entries.setdefault(page, []).append((level, title))
+        return _match_headings(pages, entries, keep_unmatched=True)
+
+    if any(page.get('headings') for page in pages):
+        # (a large-font running header was already stripped from the lines and is skipped here)
+        entries = {page['page']: [(h['level'], h['text']) for h in page.get('headings', [])] for page in pages}
+        return _match_headings(pages, entries, keep_unmatched=False)
+
+    return _numbered_headings(pages)
+
+
+def layout_headings(page_spans, min_ratio=1.15, max_levels=3):
+    """
+    Headings of every page from its (text, font size) lines: lines set noticeably larger than
+    the body text of the document, the largest size is level 1.
+    """
+    size_chars = Counter()
+    for spans in page_spans:
+        for text, size in spans:
+            size_chars[round(size * 2) / 2] += len(text)
+    if not size_chars:
+        return [[] for _ in page_spans]
+
+    body_size = size_chars.most_common(1)[0][0]
+    heading_sizes = sorted({s for s in size_chars if s >= body_size * min_ratio}, reverse=True)
+    levels = {size: min(rank + 1, max_levels) for rank, size in enumerate(heading_sizes)}
+
+    result = []
+    for spans in page_spans:
+        headings = []
+        for text, size in spans:
+            level = levels.get(round(size * 2) / 2)
+            text = text.strip()
+            if level and text and not text.isdigit() and len(text) <= MAX_TITLE_LENGTH:
+                headings.append({'text': text, 'level': level})
+        result.append(headings)
+    return result
+
+
+def split_sections(pages, headings):
+    """
+    Cut the page lines into sections at the headings. Every section keeps its chapter (the
+    level 1 heading above it), its heading path and the lines it has on each page.
+    """
+    sections = []
+    path = {}
+    current = {'chapter': FRONT_MATTER, 'heading': FRONT_MATTER, 'parts': []}
+
+    def add(page, lines):
+        if lines:
+            current['parts'].append({'page': page['page'], 'lines': lines, 'images': page.get('images', [])})
+
+    for page in pages:
+        position = 0
+        for index, consumed, level, title in sorted(headings.get(page['page'], []), key=lambda h: h[0]):
+            add(page, page['lines'][position:index])
+            if current['parts']:
+                sections.append(current)
+            path = {lvl: t for lvl, t in path.items() if lvl < level}
+            path[level] = title
+            current = {
+                'chapter': path[min(path)],
+                'heading': HEADING_SEPARATOR.join(path[lvl] for lvl in sorted(path)),
+                'parts': []
+            }
+            add(page, [title])
+            position = index + consumed
+        add(page, page['lines'][position:])
+
+    if current['parts']:
+        sections.append(current)
+    return sections
+
+
+def common_heading(headings):
+    """The heading path shared by all headings ("9 CLEANING > 9.4 ..." + "9 CLEANING > 9.5 ..." -> "9 CLEANING")"""
+    paths = [heading.split(HEADING_SEPARATOR) for heading in headings]
+    common = []
+    for parts in zip(*paths):
+        if any(part != parts[0] for part in parts):
+            break
+        common.append(parts[0])
+    return HEADING_SEPARATOR.join(common) or None
+
+
+def text_fingerprint(text):
+    text = re.sub(r'[\W\d_]+', ' ', text.lower())
+    return hashlib.sha1(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def dedupe_chunks(chunks):
+    """Keep the first of every set of identical chunks, the others only add their pages to it"""
+    kept = {}
+    result = []
+    for chunk in chunks:
+        key = text_fingerprint(chunk['text'])
+        if key in kept:
+            original = kept[key]['metadata']
+            original.setdefault('duplicate_pages', [])
+            for page in chunk['metadata'].get('pages', [chunk['metadata']['source_page']]):
+                if page not in original['duplicate_pages'] and page not in original.get('pages', []):
+                    original['duplicate_pages'].append(page)
+            continue
+        kept[key] = chunk
+        result.append(chunk)
+    return result, len(chunks) - len(result)
@@ -6,17 +6,34 @@ import json
 import re
 from pathlib import Path
 from VectorDB import VectorDB
+from document_structure import (
+    page_lines, normalize_line, find_repeated_lines, strip_repeated_lines, find_headings, layout_headings,
+    split_sections, dedupe_chunks, common_heading
+)
 
 
 class FrankePDFProcessor:
     """Process Franke Coffee Systems PDFs for RAG system"""
 
-    def __init__(self, tesseract_path=None, target_tokens=400, overlap_tokens=50):
+    def __init__(self, tesseract_path=None, target_tokens=400, overlap_tokens=50, image_store=None,
+                 ocr_cache=None, ocr_dpi=(150, 300), ocr_min_confidence=60, ocr_lang='eng',
+                 structure_aware=True):
         if tesseract_path:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
+        # optional OCRCache, pages that were already OCRed are read from disk instead of Tesseract
+        self.ocr_cache = ocr_cache
+        # OCR first at the lowest DPI and only re-render at the next one if the confidence is too low
+        self.ocr_dpi = tuple(ocr_dpi)
+        self.ocr_min_confidence = ocr_min_confidence
+        self.ocr_lang = ocr_lang
+
         self.target_tokens = target_tokens
         self.overlap_tokens = overlap_tokens
+        # chunk by document section (outline / headings) instead of page by page
+        self.structure_aware = structure_aware
+        # optional ImageStore, when set the figures are extracted and linked to the chunks
+        self.image_store = image_store
 
     def extract_text_and_metadata(self, pdf_path):
         """Extract text, images, and metadata from PDF"""
@@ -27,46 +44,132 @@ class FrankePDFProcessor:
             'total_pages': len(doc),
             'text_content': [],
             'images': [],
-            'metadata': doc.metadata
+            'metadata': doc.metadata,
+            # outline as [level, title, page], drives the section-aware chunking when the PDF has one
+            'toc': doc.get_toc()
         }
 
+        # Save the images to the content-addressed store (deduplicated by hash)
+        page_images = {}
+        image_info = {}
+        if self.image_store is not None:
+            page_images, image_info = self.image_store.extract_from_document(doc)
+
+        page_spans = []
         for page_num in range(len(doc)):
             page = doc[page_num]
             text = page.get_text()
+            page_spans.append(self.font_lines(page))
 
             # If the text is really short (less than 50 chars), the page wont have selectable text
             # In this case it uses OCR to extract text from the image of the page
             if len(text.strip()) < 50:
-                pix = page.get_pixmap()
-                img_data = pix.tobytes("png")
-                img = Image.open(io.BytesIO(img_data))
-                ocr_text = pytesseract.image_to_string(img)
+                ocr_text = self.ocr_page(page)
                 text = ocr_text if len(ocr_text) > len(text) else text
 
             result['text_content'].append({
                 'page': page_num + 1,
                 'text': text,
-                'char_count': len(text)
+                'char_count': len(text),
+                'images': page_images.get(page_num + 1, [])
             })
 
             # Extract the images
-            image_list = page.get_images()
-            for img_index, img in enumerate(image_list):
-                result['images'].append({
-                    'page': page_num + 1,
-                    'image_index': img_index,
-                    'xref': img[0]
-                })
+            if self.image_store is not None:
+                for img_index, image_hash in enumerate(page_images.get(page_num + 1, [])):
+                    result['images'].append({
+                        'page': page_num + 1,
+                        'image_index': img_index,
+                        'hash': image_hash,
+                        **image_info[image_hash]
+                    })
+            else:
+                image_list = page.get_images()
+                for img_index, img in enumerate(image_list):
+                    result['images'].append({
+                        'page': page_num + 1,
+                        'image_index': img_index,
+                        'xref': img[0]
+                    })
+
+        # headings by font size, used for chunking when the PDF has no outline
+        for page, headings in zip(result['text_content'], layout_headings(page_spans)):
+            page['headings'] = headings
 
         doc.close()
         return result
 
-    def clean_text(self, text):
-        """Clean the text by removing headers, footers, excessive whitespace"""
-        # Remove stuff that appear on every page (got what to get rid of from ChatGPT)
-        text = re.sub(r'Franke Kaffeemaschinen AG', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'User manual A1000', '', text, flags=re.IGNORECASE)
+    def font_lines(self, page):
+        """(text, largest font size) of every text line on the page"""
+        lines = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if spans:
+                    lines.append((''.join(span["text"] for span in spans), max(span["size"] for span in spans)))
+        return lines
+
+    def ocr_settings(self):
+        """Everything that changes the OCR output, part of the cache key"""
+        return {
+            'dpi': list(self.ocr_dpi),
+            'min_confidence': self.ocr_min_confidence,
+            'lang': self.ocr_lang
+        }
+
+    def render_page(self, page, dpi):
+        return page.get_pixmap(dpi=dpi).tobytes("png")
+
+    def run_ocr(self, img_data):
+        """OCR one rendered page, returns the text and the mean word confidence"""
+        img = Image.open(io.BytesIO(img_data))
+        data = pytesseract.image_to_data(img, lang=self.ocr_lang, output_type=pytesseract.Output.DICT)
+
+        # rebuild the text line by line from the word boxes
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            if conf < 0 or not word.strip():
+                continue
+            confidences.append(conf)
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
+
+    def ocr_page(self, page):
+        """OCR a page, adaptive DPI and cached on disk when an OCRCache is set"""
+        img_data = self.render_page(page, self.ocr_dpi[0])
+
+        # the key is the low DPI render, the cached entry already holds the final result
+        # even when that came from a higher DPI re-render
+        key = None
+        if self.ocr_cache is not None:
+            key = self.ocr_cache.make_key(img_data, self.ocr_settings())
+            cached = self.ocr_cache.get(key)
+            if cached is not None:
+                return cached['text']
+
+        text, confidence = self.run_ocr(img_data)
+        used_dpi = self.ocr_dpi[0]
+        for dpi in self.ocr_dpi[1:]:
+            if confidence >= self.ocr_min_confidence:
+                break
+            better_text, better_confidence = self.run_ocr(self.render_page(page, dpi))
+            if better_confidence > confidence:
+                text, confidence, used_dpi = better_text, better_confidence, dpi
+
+        if key is not None:
+            self.ocr_cache.put(key, {'text': text, 'confidence': confidence, 'dpi': used_dpi})
+
+        return text
 
+    def clean_text(self, text):
+        """Clean the text by removing page numbers and excessive whitespace"""
+        # (headers and footers are removed before this by prepare_pages)
         # Remove the \n and whitespace
         text = re.sub(r'\n+', ' ', text)
         text = re.sub(r' +', ' ', text)
@@ -81,62 +184,167 @@ class FrankePDFProcessor:
         """Estimate of the count estimation"""
         return int(len(text.split()) * 0.75)
 
-    def chunk_page(self, page_data, global_chunk_id):
-        """Chunk a single page into 300 to 500 token segments"""
-        text = self.clean_text(page_data['text'])
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+    def join_lines(self, lines):
+        """Lines of a section back into running text, words split over two lines are rejoined"""
+        text = '\n'.join(lines)
+        text = re.sub(r'(\w)-\n(?=[a-z])', r'\1', text)
+        return re.sub(r'\s+', ' ', text).strip()
 
+    def pack_sentences(self, sentences):
+        """Group (sentence, page) pairs into chunks of about target_tokens, with overlap"""
         chunks = []
         current_chunk = []
+        current_pages = []
         current_tokens = 0
 
-        for sentence in sentences:
+        for sentence, page in sentences:
             sentence_tokens = self.estimate_tokens(sentence)
 
             # Save chunk if adding this sentence would exceed target
             if current_tokens + sentence_tokens > self.target_tokens and current_chunk:
-                chunk_text = ' '.join(current_chunk)
                 chunks.append({
-                    'text': chunk_text,
+                    'text': ' '.join(current_chunk),
                     'token_count': current_tokens,
-                    'metadata': {
-                        'source_page': page_data['page'],
-                        'chunk_id': global_chunk_id
-                    }
+                    'pages': sorted(set(current_pages))
                 })
-                global_chunk_id += 1
 
                 # Keep some overlap for context
                 overlap_words = ' '.join(current_chunk).split()[-self.overlap_tokens:]
                 current_chunk = [' '.join(overlap_words), sentence]
+                current_pages = [current_pages[-1], page]
                 current_tokens = self.estimate_tokens(' '.join(current_chunk))
             else:
                 current_chunk.append(sentence)
+                current_pages.append(page)
                 current_tokens += sentence_tokens
 
         # Add remaining text as final chunk
         if current_chunk:
-            chunk_text = ' '.join(current_chunk)
             chunks.append({
-                'text': chunk_text,
+                'text': ' '.join(current_chunk),
                 'token_count': current_tokens,
+                'pages': sorted(set(current_pages))
+            })
+
+        return chunks
+
+    def chunk_page(self, page_data, global_chunk_id):
+        """Chunk a single page into 300 to 500 token segments"""
+        text = self.clean_text(page_data['text'])
+        sentences = [(sentence, page_data['page']) for sentence in re.split(r'(?<=[.!?])\s+', text)]
+
+        chunks = []
+        for packed in self.pack_sentences(sentences):
+            chunks.append({
+                'text': packed['text'],
+                'token_count': packed['token_count'],
                 'metadata': {
                     'source_page': page_data['page'],
-                    'chunk_id': global_chunk_id
+                    'chunk_id': global_chunk_id,
+                    'images': page_data.get('images', [])
                 }
             })
             global_chunk_id += 1
 
         return chunks, global_chunk_id
 
+    def chunk_section(self, section):
+        """Chunk one section, chunks may cross page boundaries but never the section's"""
+        sentences = []
+        page_images = {}
+        for part in section['parts']:
+            page_images.setdefault(part['page'], []).extend(part['images'])
+            for sentence in re.split(r'(?<=[.!?])\s+', self.join_lines(part['lines'])):
+                if sentence:
+                    sentences.append((sentence, part['page']))
+
+        chunks = []
+        for packed in self.pack_sentences(sentences):
+            images = []
+            for page in packed['pages']:
+                images.extend(h for h in page_images.get(page, []) if h not in images)
+            chunks.append({
+                'text': packed['text'],
+                'token_count': packed['token_count'],
+                'metadata': {
+                    'source_page': packed['pages'][0],
+                    'pages': packed['pages'],
+                    'section': section['chapter'],
+                    'heading': section['heading'],
+                    'headings': [section['heading']],
+                    'images': images
+                }
+            })
+        return chunks
+
+    def merge_small_chunks(self, chunks):
+        """
+        Merge neighbouring chunks of the same chapter while they fit in target_tokens. A merged
+        chunk lists every heading it covers in 'headings', its 'heading' is the part of the
+        heading paths they all share (e.g. "9 CLEANING" for 9.4 + 9.5)
+        """
+        merged = []
+        for chunk in chunks:
+            previous = merged[-1] if merged else None
+            if (previous is not None
+                    and previous['metadata']['section'] == chunk['metadata']['section']
+                    and previous['token_count'] + chunk['token_count'] <= self.target_tokens):
+                meta = previous['metadata']
+                previous['text'] = previous['text'] + ' ' + chunk['text']
+                previous['token_count'] += chunk['token_count']
+                meta['pages'] = sorted(set(meta['pages']) | set(chunk['metadata']['pages']))
+                meta['images'] += [h for h in chunk['metadata']['images'] if h not in meta['images']]
+                meta['headings'] += [h for h in chunk['metadata']['headings'] if h not in meta['headings']]
+                meta['heading'] = common_heading(meta['headings'])
+                continue
+            merged.append(chunk)
+        return merged
+
+    def prepare_pages(self, doc_data):
+        """Page lines without the headers/footers that repeat across the document"""
+        pages = [{
+            'page': page['page'],
+            'lines': page_lines(page['text']),
+            'images': page.get('images', []),
+            'headings': page.get('headings', [])
+        } for page in doc_data['text_content']]
+
+        # "Chapter 2 ..." / "Chapter 3 ..." look alike once numbers are ignored, headings always stay
+        headings = {}
+        for _, title, page_number in doc_data.get('toc', []):
+            headings.setdefault(page_number, set()).add(normalize_line(title))
+        for page in pages:
+            headings.setdefault(page['page'], set()).update(normalize_line(h['text']) for h in page['headings'])
+
+        repeated = find_repeated_lines(pages)
+        removed = 0
+        for page in pages:
+            kept = strip_repeated_lines(page['lines'], repeated, page['page'], keep=headings[page['page']])
+            removed += len(page['lines']) - len(kept)
+            page['lines'] = kept
+        return pages, removed
+
     def chunk_document(self, doc_data):
         """Chunk entire document into 300-500 token segments"""
-        all_chunks = []
-        global_chunk_id = 0
+        pages, removed_lines = self.prepare_pages(doc_data)
 
-        for page in doc_data['text_content']:
-            page_chunks, global_chunk_id = self.chunk_page(page, global_chunk_id)
-            all_chunks.extend(page_chunks)
+        if self.structure_aware:
+            all_chunks = []
+            for section in split_sections(pages, find_headings(pages, doc_data.get('toc'))):
+                all_chunks.extend(self.chunk_section(section))
+            all_chunks = self.merge_small_chunks(all_chunks)
+        else:
+            all_chunks = []
+            global_chunk_id = 0
+            for page in pages:
+                page_data = {'page': page['page'], 'text': '\n'.join(page['lines']), 'images': page['images']}
+                page_chunks, global_chunk_id = self.chunk_page(page_data, global_chunk_id)
+                all_chunks.extend(page_chunks)
+
+        # the same warning or notice repeated in several places only needs to be embedded once
+        all_chunks, duplicates = dedupe_chunks(all_chunks)
+        for chunk_id, chunk in enumerate(all_chunks):
+            chunk['metadata']['chunk_id'] = chunk_id
 
         # Calculate stats
         if all_chunks:
@@ -155,7 +363,10 @@ class FrankePDFProcessor:
             'chunk_stats': {
                 'min_tokens': min_tokens,
                 'max_tokens': max_tokens,
-                'avg_tokens': avg_tokens
+                'avg_tokens': avg_tokens,
+                'total_tokens': sum(c['token_count'] for c in all_chunks),
+                'duplicate_chunks': duplicates,
+                'boilerplate_lines': removed_lines
             }
         }
 
@@ -1,6 +1,7 @@
 #multi manual pipleine
 
 
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,11 +11,16 @@ THIS_DIR = Path(__file__).resolve().parent # .../retrieval_backbone
 PROJECT_ROOT = THIS_DIR.parent # repo root (one level up)
 
 sys.path.append(str(THIS_DIR))
+sys.path.append(str(PROJECT_ROOT))
 
 #import the FrankePDFProcessor class
 from franke_processor_regex import FrankePDFProcessor
 from VectorDB import VectorDB
-import json
+from image_store import ImageStore
+from ocr_cache import OCRCache
+from artifacts import write_processed, write_chunked, chunk_to_vector_doc
+from profiling import profile_call
+from config import FAISS_STORE_DIR
 
 #folder containing all your raw Franke manuals
 pdf_dir = PROJECT_ROOT / "data" / "raw"
@@ -24,13 +30,20 @@ pdf_dir = PROJECT_ROOT / "data" / "raw"
 output_dir = PROJECT_ROOT / "data" / "processed"
 output_dir.mkdir(parents=True, exist_ok=True)
 
-#save to faiss vector db
-save_dir = THIS_DIR / "faiss_store"
+#content-addressed store for the figures in the manuals (served by the API under /images)
+image_dir = PROJECT_ROOT / "data" / "images"
+
+#OCR results cached by page render hash, so rechunking never reruns Tesseract
+ocr_cache_dir = PROJECT_ROOT / "data" / "ocr_cache"
+
+#save to faiss vector db (the store the API watches for new snapshots)
+save_dir = PROJECT_ROOT / FAISS_STORE_DIR
 
 
 def main():
     #initialize the processor
-    processor = FrankePDFProcessor(target_tokens=400, overlap_tokens=50)
+    processor = FrankePDFProcessor(target_tokens=400, overlap_tokens=50, image_store=ImageStore(image_dir),
+                                   ocr_cache=OCRCache(ocr_cache_dir))
 
     #iterate through all PDFs in the folder
     all_docs = []
@@ -40,44 +53,23 @@ def main():
         #extract and chunk text
         processed_result, chunked_result = processor.process_franke_pdf(pdf_path)
 
-        #save individual JSONs for each pdf
-        processed_path = output_dir / f"{pdf_path.stem}_processed.json"
-        chunked_path = output_dir / f"{pdf_path.stem}_chunked.json"
+        #save individual artifacts for each pdf (line-delimited, streamed record by record)
+        processed_path = output_dir / f"{pdf_path.stem}_processed.jsonl"
+        chunked_path = output_dir / f"{pdf_path.stem}_chunked.jsonl"
 
-        with open(processed_path, 'w', encoding='utf-8') as f:
-            json.dump(processed_result, f, indent=2, ensure_ascii=False)
-
-        with open(chunked_path, 'w', encoding='utf-8') as f:
-            json.dump(chunked_result, f, indent=2, ensure_ascii=False)
+        write_processed(processed_path, processed_result)
+        write_chunked(chunked_path, chunked_result)
 
         #add chunks to combined document list
         for chunk in chunked_result["chunks"]:
-            #try to extract the model name (like "A1000") from the file name
-            file_name = chunked_result["file_name"]
-            if "A1000" in file_name:
-                manual_name = "A1000"
-            elif "A300" in file_name:
-                manual_name = "A300"
-            elif "A600" in file_name:
-                manual_name = "A600"
-            elif "S700" in file_name:
-                manual_name = "S700"
-            else:
-                manual_name = "Unknown"
-
-            all_docs.append({
-                "text": chunk["text"],
-                "metadata": {
-                    "source_file": chunked_result["file_name"],
-                    "manual": manual_name,
-                    "source_page": chunk["metadata"]["source_page"],
-                    "chunk_id": chunk["metadata"]["chunk_id"]
-                }
-            })
+            all_docs.append(chunk_to_vector_doc(chunked_result["file_name"], chunk))
+
 
+    cache = processor.ocr_cache
+    print(f"\nOCR cache: {cache.hits} hits, {cache.misses} misses")
 
     # Save to FAISS
-    if save_dir.exists() and (save_dir / "index.bin").exists():
+    if VectorDB.exists(save_dir):
         print("\nFAISS store exists, updating with new manuals.....")
         db = VectorDB.load(save_dir=save_dir)
         db.add_documents(all_docs)
@@ -90,5 +82,25 @@ def main():
     db.save(save_dir=save_dir)
     print("\nMulti-manual FAISS database updated and saved successfully")
 
+#functions whose cumulative time is reported by --profile
+PROFILE_STAGES = {
+    "PDF extraction": "extract_text_and_metadata",
+    "Tesseract OCR": "run_ocr",
+    # the section chunker cleans the pages up front (clean_text only runs in the page chunker)
+    "Header/footer removal": "prepare_pages",
+    "Section detection": "find_headings",
+    "Chunking": "chunk_document",
+    "Image store": "extract_from_document",
+    "Embedding + index": "add_documents",
+}
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Process all manuals in data/raw into the FAISS store")
+    parser.add_argument("--profile", action="store_true",
+                        help="run under cProfile + stack sampling, writes .prof/.folded files to profiles/")
+    args = parser.parse_args()
+
+    if args.profile:
+        profile_call(main, output_dir=PROJECT_ROOT / "profiles", prefix="ingestion", stages=PROFILE_STAGES)
+    else:
+        main()
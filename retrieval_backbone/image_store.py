@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+
+class ImageStore:
+    """
+    Content-addressed store for the figures extracted from the manuals.
+    Every image is saved once under the sha256 of its bytes (so the same warning icon
+    used on hundreds of pages is only stored once) together with a small thumbnail.
+
+    Layout:  <root>/<hash[:2]>/<hash>.<ext>  and  <root>/<hash[:2]>/<hash>_thumb.png
+    """
+    def __init__(self, root_dir, thumb_size=256, min_side=32, max_workers=None, max_pages=5):
+        self.root_dir = Path(root_dir)
+        self.thumb_size = thumb_size
+        self.min_side = min_side         # skip tiny images like bullets and lines
+        self.max_pages = max_pages       # an image on more pages is a logo/icon, not a figure
+        self.max_workers = max_workers
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+
+    def image_path(self, image_hash, ext):
+        return self.root_dir / image_hash[:2] / f"{image_hash}.{ext}"
+
+    def thumb_path(self, image_hash):
+        return self.root_dir / image_hash[:2] / f"{image_hash}_thumb.png"
+
+    def find(self, image_hash):
+        """Return the path of a stored image (any extension) or None"""
+        folder = self.root_dir / image_hash[:2]
+        if not folder.exists():
+            return None
+        for path in folder.glob(f"{image_hash}.*"):
+            return path
+        return None
+
+    def _store_one(self, data, ext):
+        # hash the raw bytes, identical images from any page/manual end up in the same file
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = self.image_path(image_hash, ext)
+        thumb = self.thumb_path(image_hash)
+
+        if path.exists() and thumb.exists():
+            return image_hash, False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(path, data)
+
+        img = Image.open(io.BytesIO(data))
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+        img.thumbnail((self.thumb_size, self.thumb_size))
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        self._write_atomic(thumb, buffer.getvalue())
+        return image_hash, True
+
+    def _write_atomic(self, path, data):
+        # write to a temp file first so a crash never leaves half an image behind
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def extract_from_document(self, doc):
+        """
+        Extract every image of an open PyMuPDF document and store it.
+        Returns {page_number: [image hashes]} plus a dict with info on each hash.
+        Images repeated on more than max_pages pages (logos, warning icons) are stored but
+        not linked to the pages, otherwise every chunk would come with them.
+        """
+        # PyMuPDF documents are not thread safe, so read the raw bytes in this thread.
+        # Pages reuse the same xref for repeated images, so each xref is only read once.
+        raw_images = {}
+        page_xrefs = {}
+        for page_num in range(len(doc)):
+            xrefs = []
+            for img in doc[page_num].get_images():
+                xref = img[0]
+                xrefs.append(xref)
+                if xref in raw_images:
+                    continue
+                extracted = doc.extract_image(xref)
+                if not extracted:
+                    raw_images[xref] = None
+                    continue
+                if min(extracted["width"], extracted["height"]) < self.min_side:
+                    raw_images[xref] = None
+                    continue
+                raw_images[xref] = extracted
+            page_xrefs[page_num + 1] = xrefs
+
+        # hashing, writing and making thumbnails is done in parallel
+        xrefs = [x for x, extracted in raw_images.items() if extracted is not None]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            stored = list(pool.map(
+                lambda x: self._store_one(raw_images[x]["image"], raw_images[x]["ext"]),
+                xrefs
+            ))
+
+        xref_to_hash = {}
+        image_info = {}
+        new_images = 0
+        for xref, (image_hash, is_new) in zip(xrefs, stored):
+            xref_to_hash[xref] = image_hash
+            new_images += is_new
+            image_info[image_hash] = {
+                "width": raw_images[xref]["width"],
+                "height": raw_images[xref]["height"],
+                "ext": raw_images[xref]["ext"],
+            }
+
+        page_images = {}
+        page_counts = {}
+        for page, page_xref_list in page_xrefs.items():
+            hashes = []
+            for xref in page_xref_list:
+                image_hash = xref_to_hash.get(xref)
+                if image_hash and image_hash not in hashes:
+                    hashes.append(image_hash)
+                    page_counts[image_hash] = page_counts.get(image_hash, 0) + 1
+            page_images[page] = hashes
+
+        repeated = {h for h, count in page_counts.items() if count > self.max_pages}
+        if repeated:
+            page_images = {page: [h for h in hashes if h not in repeated] for page, hashes in page_images.items()}
+
+        print(f"Images: {len(xrefs)} unique in document, {new_images} newly stored, "
+              f"{len(repeated)} repeated on more than {self.max_pages} pages not linked")
+        return page_images, image_info
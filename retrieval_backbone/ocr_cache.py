@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class OCRCache:
+    """
+    On-disk cache for OCR results.
+    Entries are keyed by the hash of the rendered page image plus the OCR settings,
+    so reprocessing a manual (e.g. with a new target_tokens) never runs Tesseract again
+    for a page it has already seen, while changing the OCR settings does.
+
+    Layout:  <root>/<key[:2]>/<key>.json
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, image_bytes, settings):
+        h = hashlib.sha256(image_bytes)
+        h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        path = self._path(key)
+        if not path.exists():
+            self.misses += 1
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # unreadable entry, treat it as a miss and let it be rewritten
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temp file and rename so a crash never leaves a broken entry
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
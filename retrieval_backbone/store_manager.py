@@ -0,0 +1,139 @@
+import threading
+from contextlib import contextmanager
+
+
+class StoreHandle:
+    """One loaded store plus the number of searches currently using it"""
+    def __init__(self, db, version):
+        self.db = db
+        self.version = version
+        self.refs = 0
+        self.retired = False
+
+
+class StoreManager:
+    """
+    Keeps the FAISS store of an API worker up to date without downtime.
+
+    A background thread polls the CURRENT pointer written by VectorDB.save. When it names a
+    new snapshot, the snapshot is loaded in that thread (requests keep using the old one),
+    then swapped in. Searches hold a reference through acquire(), so an old store is only
+    released once every in-flight search on it has finished.
+
+    load_fn(save_dir, previous_db) -> db and version_fn(save_dir) -> version are passed in so
+    this works with anything that has the VectorDB save/load layout.
+    """
+    def __init__(self, save_dir, load_fn, version_fn, poll_interval=5.0):
+        self.save_dir = save_dir
+        self.load_fn = load_fn
+        self.version_fn = version_fn
+        self.poll_interval = poll_interval
+        self._current = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def _ensure_loaded(self):
+        if self._current is not None:
+            return
+        with self._load_lock:
+            if self._current is None:
+                version = self.version_fn(self.save_dir)
+                db = self.load_fn(self.save_dir, None)
+                with self._lock:
+                    self._current = StoreHandle(db, getattr(db, "version", version))
+
+    @contextmanager
+    def acquire(self):
+        """Use the current store; it stays valid until the with block ends, even across a reload"""
+        self._ensure_loaded()
+        with self._lock:
+            handle = self._current
+            handle.refs += 1
+        try:
+            yield handle.db
+        finally:
+            with self._lock:
+                handle.refs -= 1
+                if handle.retired and handle.refs == 0:
+                    self._release(handle)
+
+    def current(self):
+        """The current store without taking a reference (for scripts and quick checks)"""
+        self._ensure_loaded()
+        return self._current.db
+
+    @property
+    def version(self):
+        return self._current.version if self._current is not None else None
+
+    def _release(self, handle):
+        print(f"Released FAISS snapshot {handle.version}")
+        # bundles keep the documents file and the mapped index open until closed
+        close = getattr(handle.db, "close", None)
+        if close is not None:
+            close()
+        handle.db = None
+
+    def _swap(self, db, version):
+        with self._lock:
+            old = self._current
+            self._current = StoreHandle(db, version)
+            if old is not None:
+                old.retired = True
+                if old.refs == 0:
+                    self._release(old)
+        self.reloads += 1
+        print(f"Swapped in FAISS snapshot {version}")
+
+    def check_for_update(self):
+        """Load and swap in the published snapshot if it changed, returns True when it did"""
+        version = self.version_fn(self.save_dir)
+        if version is None or version == self.version:
+            return False
+        with self._load_lock:
+            if version == self.version:
+                return False
+            previous = self._current.db if self._current is not None else None
+            try:
+                db = self.load_fn(self.save_dir, previous)
+            except Exception as e:
+                # keep serving the old snapshot, try again on the next poll
+                self.reload_errors += 1
+                print(f"Could not load FAISS snapshot {version}: {e}")
+                return False
+            # the pointer may have moved while we were loading, go with what was loaded
+            self._swap(db, getattr(db, "version", version))
+        return True
+
+    def start_watching(self):
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name="faiss-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_update()
+            except Exception as e:
+                print(f"FAISS store watcher error: {e}")
+
+    def stats(self):
+        with self._lock:
+            current = self._current
+            return {
+                "version": current.version if current else None,
+                "in_flight": current.refs if current else 0,
+                "reloads": self.reloads,
+                "reload_errors": self.reload_errors,
+            }
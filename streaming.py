@@ -0,0 +1,140 @@
+"""
+Helpers for the /stream websocket.
+
+Every message sent to the frontend is a typed JSON frame:
+    {"type": "sources", "sources": [...], "images": [...]}   retrieved pages + figures, sent first
+    {"type": "tokens",  "data": "..."}                       a batch of answer text
+    {"type": "done",    "stats": {...}}                      end of the answer
+    {"type": "error",   "message": "..."}                    something went wrong
+
+The LLM yields very small chunks, so tokens are coalesced into bigger frames that are
+flushed when a time window passes or the buffer reaches a byte size.
+"""
+
+import asyncio
+import time
+
+
+def make_frame(frame_type, **payload):
+    return {"type": frame_type, **payload}
+
+
+async def coalesce(tokens, flush_interval_ms=50, flush_bytes=512):
+    """
+    Group an async iterator of text chunks into larger strings.
+    A batch is yielded once flush_interval_ms passed since its first chunk or once it
+    holds flush_bytes bytes, whichever comes first. A value <= 0 for both turns it off.
+    """
+    if flush_interval_ms <= 0 and flush_bytes <= 0:
+        async for token in tokens:
+            yield token
+        return
+
+    loop = asyncio.get_running_loop()
+    interval = flush_interval_ms / 1000 if flush_interval_ms > 0 else None
+    queue = asyncio.Queue()
+    end = object()
+
+    # read the LLM stream in its own task so a half-full batch can be flushed on time
+    # even while we are waiting for the next chunk
+    async def pump():
+        try:
+            async for token in tokens:
+                await queue.put(token)
+            await queue.put(end)
+        except Exception as e:
+            await queue.put(e)
+
+    pump_task = asyncio.create_task(pump())
+    buffer = []
+    buffered_bytes = 0
+    deadline = None
+
+    try:
+        while True:
+            timeout = None
+            if buffer and interval is not None:
+                timeout = max(0.0, deadline - loop.time())
+
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+                continue
+
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                raise item
+
+            if not buffer and interval is not None:
+                deadline = loop.time() + interval
+            buffer.append(item)
+            buffered_bytes += len(item.encode("utf-8"))
+
+            if flush_bytes > 0 and buffered_bytes >= flush_bytes:
+                yield "".join(buffer)
+                buffer, buffered_bytes = [], 0
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        pump_task.cancel()
+
+
+class StreamStats:
+    """Frame counters for one stream, plus the totals for every stream since startup"""
+    totals = {
+        "streams": 0,
+        "frames": 0,
+        "chunks": 0,
+        "bytes": 0,
+    }
+    started_at = time.time()
+
+    def __init__(self):
+        self.frames = 0
+        self.chunks = 0
+        self.bytes = 0
+        self._start = time.perf_counter()
+
+    async def count_chunks(self, tokens):
+        """Pass the raw LLM chunks through, counting them before they get coalesced"""
+        async for token in tokens:
+            self.chunks += 1
+            yield token
+
+    def record(self, text):
+        self.frames += 1
+        self.bytes += len(text.encode("utf-8"))
+
+    def finish(self):
+        duration = time.perf_counter() - self._start
+
+        totals = StreamStats.totals
+        totals["streams"] += 1
+        totals["frames"] += self.frames
+        totals["chunks"] += self.chunks
+        totals["bytes"] += self.bytes
+
+        return {
+            "frames": self.frames,
+            "llm_chunks": self.chunks,
+            "bytes": self.bytes,
+            "duration_ms": round(duration * 1000, 1),
+            "frames_per_sec": round(self.frames / duration, 1) if duration > 0 else 0.0,
+        }
+
+    @classmethod
+    def summary(cls):
+        uptime = time.time() - cls.started_at
+        totals = dict(cls.totals)
+        totals["uptime_seconds"] = round(uptime, 1)
+        totals["frames_per_sec"] = round(totals["frames"] / uptime, 2) if uptime > 0 else 0.0
+        # CPU of the whole worker process (every request, not only streams), a per-stream
+        # figure can't be separated from the streams running next to it
+        totals["process_cpu_seconds"] = round(time.process_time(), 3)
+        return totals
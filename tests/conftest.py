@@ -0,0 +1,49 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# the ingestion scripts import their neighbours directly (from artifacts import ...)
+sys.path.insert(0, str(PROJECT_ROOT / "retrieval_backbone"))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+class HashEmbedder:
+    """Bag of words hashed into a small vector, stands in for the SentenceTransformer"""
+    dim = 64
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1, norms)
+        return vectors
+
+
+def make_doc(text, manual, page, section=None, source_file=None):
+    metadata = {"manual": manual, "source_file": source_file or f"{manual}.pdf", "source_page": page}
+    if section is not None:
+        metadata["section"] = section
+    return {"text": text, "metadata": metadata}
+
+
+@pytest.fixture
+def embedder():
+    return HashEmbedder()
+
+
+@pytest.fixture
+def make_db(embedder):
+    from retrieval_backbone.VectorDB import VectorDB
+
+    def build(documents):
+        db = VectorDB(model=embedder)
+        db.add_documents(documents)
+        return db
+    return build
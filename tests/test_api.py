@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from retrieval_backbone.image_store import ImageStore
+from test_image_store import png
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"x", W/"y"', False),
+    ("*", True),
+])
+def test_etag_matches(header, expected):
+    assert main.etag_matches(header, '"abc"') is expected
+
+
+def test_image_revalidation(tmp_path, monkeypatch):
+    store = ImageStore(tmp_path)
+    image_hash, _ = store._store_one(png("green"), "png")
+    monkeypatch.setattr(main, "image_store", store)
+    client = TestClient(main.app)
+
+    response = client.get(f"/images/{image_hash}")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{image_hash}"'
+
+    response = client.get(f"/images/{image_hash}", headers={"If-None-Match": f'"other", W/"{image_hash}"'})
+    assert response.status_code == 304
+
+
+class FakeWebSocket:
+    """Receives one question, send_json fails once the client 'closed' the connection"""
+    def __init__(self, question, close_after=None):
+        self.question = question
+        self.close_after = close_after
+        self.frames = []
+        self.sends_after_close = 0
+
+    async def receive_json(self):
+        return {"question": self.question}
+
+    async def send_json(self, frame):
+        if self.close_after is not None and len(self.frames) >= self.close_after:
+            self.sends_after_close += 1
+            raise RuntimeError("websocket closed")
+        self.frames.append(frame)
+
+
+class FakePipeline:
+    async def astream(self, state):
+        yield {"planner": {"manuals_mentioned": ["A1000"], "sub_queries": [], "plan": ""}}
+        yield {"retriever": {"context": "ctx", "images": [], "sources": [], "retrieval_decision": "new"}}
+
+
+def fake_llm(answer):
+    async def stream(context, question, session_id=None):
+        for word in answer.split():
+            await asyncio.sleep(0.02)
+            yield word + " "
+    return stream
+
+
+@pytest.fixture
+def fake_stream(monkeypatch):
+    monkeypatch.setattr(main, "pipeline_app", FakePipeline())
+    monkeypatch.setattr(main, "stream_synthesizer_agent", fake_llm("one two three four"))
+    monkeypatch.setattr(main, "STREAM_FLUSH_INTERVAL_MS", 1)
+
+
+def test_stream_frames(fake_stream):
+    websocket = FakeWebSocket("How do I descale the A1000?")
+    asyncio.run(main.stream_answer(websocket))
+    types = [frame["type"] for frame in websocket.frames]
+    assert types[0] == "sources"
+    assert types[-1] == "done"
+    assert "".join(f["data"] for f in websocket.frames if f["type"] == "tokens") == "one two three four "
+
+
+def test_no_done_frame_after_disconnect(fake_stream):
+    # sources + one tokens frame get through, then the client is gone
+    websocket = FakeWebSocket("How do I descale the A1000?", close_after=2)
+    asyncio.run(main.stream_answer(websocket))
+    assert [frame["type"] for frame in websocket.frames] == ["sources", "tokens"]
+    # only the tokens frame that hit the closed socket, no "done" (or "error") attempted after it
+    assert websocket.sends_after_close == 1
+
+
+def test_trace_middleware_only_when_sampling():
+    assert bool(main.app.user_middleware) == (main.PROFILING_TRACE_SAMPLE_RATE > 0)
+
+
+def test_profile_endpoint_hidden_without_token(monkeypatch):
+    monkeypatch.setattr(main, "PROFILING_ADMIN_TOKEN", "")
+    client = TestClient(main.app)
+    assert client.post("/admin/profile", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+def test_profile_endpoint_checks_token(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "PROFILING_ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(main, "PROFILING_OUTPUT_DIR", str(tmp_path))
+    client = TestClient(main.app)
+    assert client.post("/admin/profile").status_code == 403
+    assert client.post("/admin/profile", headers={"X-Admin-Token": "s3cre"}).status_code == 403
+
+    response = client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert response.json()["mode"] == "sample"
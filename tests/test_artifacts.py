@@ -0,0 +1,64 @@
+import pytest
+
+from retrieval_backbone.artifacts import ArtifactReader, ArtifactWriter, index_path_for, write_chunked
+
+
+def chunked_result(chunks):
+    return {
+        "file_name": "A1000_manual.pdf",
+        "total_pages": 3,
+        "total_chunks": len(chunks),
+        "chunk_stats": {"avg_tokens": 10},
+        "chunks": chunks,
+    }
+
+
+def chunk(i):
+    return {"text": f"chunk {i} ünïcode", "metadata": {"source_page": i, "chunk_id": f"c{i}"}}
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "A1000_chunked.jsonl"
+    chunks = [chunk(i) for i in range(5)]
+    write_chunked(path, chunked_result(chunks))
+
+    reader = ArtifactReader(path)
+    assert reader.kind == "chunked"
+    assert reader.header["file_name"] == "A1000_manual.pdf"
+    assert reader.summary["total_chunks"] == 5
+    assert len(reader) == 5
+    assert reader[3] == chunks[3]
+    assert reader[-1] == chunks[4]
+    assert list(reader) == chunks
+
+
+def test_reader_rebuilds_missing_index(tmp_path):
+    path = tmp_path / "A1000_chunked.jsonl"
+    write_chunked(path, chunked_result([chunk(i) for i in range(3)]))
+    index_path_for(path).unlink()
+
+    reader = ArtifactReader(path)
+    assert len(reader) == 3
+    assert reader[2] == chunk(2)
+
+
+class Broken(list):
+    def __iter__(self):
+        yield chunk(0)
+        raise RuntimeError("disk full")
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    path = tmp_path / "A1000_chunked.jsonl"
+    with pytest.raises(RuntimeError):
+        write_chunked(path, chunked_result(Broken()))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_writer_discards_on_error(tmp_path):
+    path = tmp_path / "pages.jsonl"
+    with pytest.raises(ValueError):
+        with ArtifactWriter(path, "processed") as writer:
+            writer.write({"page": 1})
+            raise ValueError
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,181 @@
+import json
+import os
+import tarfile
+
+import pytest
+
+import config
+from conftest import HashEmbedder, make_doc
+from retrieval_backbone import bundle
+from retrieval_backbone.VectorDB import VectorDB, SNAPSHOT_DIR
+from retrieval_backbone.store_manager import StoreManager
+
+
+class BundleModel(HashEmbedder):
+    """HashEmbedder with the SentenceTransformer methods the export uses"""
+    def __init__(self, dim=HashEmbedder.dim):
+        self.dim = dim
+        self.dtype = "float32"
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "model.safetensors"), "wb") as f:
+            f.write(b"weights")
+
+    def half(self):
+        # in place, like SentenceTransformer.half()
+        self.dtype = "float16"
+        return self
+
+
+class PreviousDB:
+    """Stands in for the store being replaced, so load_bundle reuses its model"""
+    def __init__(self, manifest, model):
+        self.model_checksum = manifest["model"]["checksum"]
+        self.model = model
+
+
+TEXTS = ["descale the boiler", "clean the milk system", "replace the water filter", "grinder blocked"]
+
+
+def export(tmp_path, texts=TEXTS, name="franke.bundle.tar", fp16=False):
+    model = BundleModel()
+    db = VectorDB(model=model)
+    db.add_documents([make_doc(text, "A1000", i + 1) for i, text in enumerate(texts)])
+    store_dir = tmp_path / f"store-{name}"
+    db.save(save_dir=str(store_dir))
+    out = tmp_path / name
+    manifest = bundle.export_bundle(str(store_dir), out, fp16=fp16, model=model)
+    return out, manifest, model
+
+
+def test_export_import_load(tmp_path):
+    out, manifest, model = export(tmp_path)
+    dest = tmp_path / "bundles"
+    imported = bundle.import_bundle(out, dest)
+    assert imported["bundle_id"] == manifest["bundle_id"]
+    assert VectorDB.current_version(str(dest)) == manifest["bundle_id"]
+
+    db = bundle.load_bundle(str(dest), PreviousDB(manifest, model))
+    assert len(db.documents) == len(TEXTS)
+    assert db.documents[1]["text"] == "clean the milk system"
+    results = db.search("clean the milk system", k=1, threshold=0.0, **db.search_options)
+    assert results[0]["text"] == "clean the milk system"
+
+    # the settings of config.json are what the pipeline searches with
+    assert db.search_options == {
+        "hierarchical": config.RETRIEVAL_HIERARCHICAL,
+        "top_sections": config.RETRIEVAL_TOP_SECTIONS or None,
+        "max_per_page": config.RETRIEVAL_MAX_PER_PAGE,
+    }
+    db.close()
+
+
+def test_search_options_from_config():
+    assert bundle.search_options({"RETRIEVAL_HIERARCHICAL": False, "RETRIEVAL_TOP_SECTIONS": 0,
+                                  "MISTRAL_MODEL": "x"}) == {"hierarchical": False, "top_sections": None}
+    assert bundle.search_options({"RETRIEVAL_TOP_SECTIONS": 4}) == {"top_sections": 4}
+
+
+def test_import_rejects_tampered_bundle(tmp_path):
+    out, manifest, _ = export(tmp_path)
+    extracted = tmp_path / "extracted"
+    with tarfile.open(out) as tar:
+        tar.extractall(extracted)
+    with open(extracted / "documents.jsonl", "ab") as f:
+        f.write(b'{"text": "injected", "metadata": {}}\n')
+    tampered = tmp_path / "tampered.tar"
+    with tarfile.open(tampered, "w") as tar:
+        for name in [bundle.MANIFEST, *manifest["files"]]:
+            tar.add(extracted / name, arcname=name)
+
+    dest = tmp_path / "bundles"
+    with pytest.raises(ValueError, match="checksum mismatch: documents.jsonl"):
+        bundle.import_bundle(tampered, dest)
+    # nothing published, no temp directory left behind
+    assert VectorDB.current_version(str(dest)) is None
+    assert os.listdir(dest / SNAPSHOT_DIR) == []
+
+
+def test_load_rejects_model_with_other_dim(tmp_path):
+    out, manifest, _ = export(tmp_path)
+    dest = tmp_path / "bundles"
+    bundle.import_bundle(out, dest)
+    with pytest.raises(ValueError, match="embeds into 32 dims, the index has 64"):
+        bundle.load_bundle(str(dest), PreviousDB(manifest, BundleModel(dim=32)))
+
+
+def test_load_rejects_document_count_mismatch(tmp_path):
+    out, manifest, model = export(tmp_path)
+    dest = tmp_path / "bundles"
+    bundle.import_bundle(out, dest)
+    manifest_path = dest / SNAPSHOT_DIR / manifest["bundle_id"] / bundle.MANIFEST
+    edited = json.loads(manifest_path.read_text())
+    edited["documents"] += 1
+    manifest_path.write_text(json.dumps(edited))
+    with pytest.raises(ValueError, match="manifest says 5"):
+        bundle.load_bundle(str(dest), PreviousDB(manifest, model))
+
+
+def test_loaded_bundle_accepts_new_documents(tmp_path):
+    out, manifest, model = export(tmp_path)
+    dest = tmp_path / "bundles"
+    bundle.import_bundle(out, dest)
+    db = bundle.load_bundle(str(dest), PreviousDB(manifest, model))
+    reader = db.documents
+
+    db.add_documents([make_doc("steam wand blocked", "A600", 1)])
+    assert isinstance(db.documents, list)
+    assert reader._file is None
+    assert len(db.documents) == db.index.ntotal == len(TEXTS) + 1
+    db.build_hierarchy()
+    results = db.search("steam wand blocked", k=1, threshold=0.0, hierarchical=True)
+    assert results[0]["metadata"]["manual"] == "A600"
+
+    db.save(save_dir=str(tmp_path / "resaved"))
+    assert len(VectorDB.load(save_dir=str(tmp_path / "resaved"), model=model).documents) == len(TEXTS) + 1
+
+
+def test_reload_closes_the_old_bundle(tmp_path):
+    dest = tmp_path / "bundles"
+    out, manifest, model = export(tmp_path)
+    bundle.import_bundle(out, dest)
+    manager = StoreManager(str(dest), lambda d, prev: bundle.load_bundle(d, PreviousDB(manifest, model)),
+                           VectorDB.current_version, poll_interval=0)
+
+    with manager.acquire() as old_db:
+        old_db.documents[0]   # opens the shared read handle
+        reader = old_db.documents
+        out, manifest, model = export(tmp_path, TEXTS[:2], "second.bundle.tar")
+        bundle.import_bundle(out, dest)
+        assert manager.check_for_update()
+        # still in use by this search
+        assert old_db.index is not None and reader._file is not None
+
+    assert old_db.index is None
+    assert reader._file is None
+    with manager.acquire() as new_db:
+        assert len(new_db.documents) == 2
+
+
+def test_fp16_export_leaves_the_callers_model_alone(tmp_path):
+    _, manifest, model = export(tmp_path, fp16=True)
+    assert manifest["model"]["dtype"] == "float16"
+    assert model.dtype == "float32"
+
+
+def test_config_holds_only_search_settings(tmp_path):
+    out, manifest, _ = export(tmp_path)
+    with tarfile.open(out) as tar:
+        exported = json.load(tar.extractfile("config.json"))
+    assert set(exported) == set(bundle.BUNDLE_SEARCH_OPTIONS)
+
+
+def test_offline_bundle_needs_a_local_llm():
+    bundle.check_llm_backend("ollama")
+    bundle.check_llm_backend("mock")
+    with pytest.raises(ValueError, match="needs network access"):
+        bundle.check_llm_backend("mistral")
@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytesseract")
+
+from document_structure import common_heading, find_headings, page_lines
+from franke_processor_regex import FrankePDFProcessor
+
+
+def processed(pages):
+    return {
+        "file_name": "A1000_manual.pdf",
+        "total_pages": len(pages),
+        "text_content": [{"page": n, "text": "\n".join(lines), "images": []} for n, lines in enumerate(pages, 1)],
+    }
+
+
+def sample_manual():
+    header = "User manual A1000"
+    return processed([
+        [header, "Franke A1000", "Copyright notice.", "1"],
+        [header, "9", "CLEANING", "9.1", "Introduction", "Clean the machine every day.", "2"],
+        [header, "9.2", "Required accessories", "Use the cleaning tablets.", "9.3", "Weekly cleaning",
+         "Clean the hopper.", "3"],
+        [header, "10", "DESCALING", "Descale every month.", "4"],
+    ])
+
+
+def test_sections_merged_within_chapter_keep_every_heading():
+    result = FrankePDFProcessor(target_tokens=400, overlap_tokens=10).chunk_document(sample_manual())
+    chunks = result["chunks"]
+    meta = [c["metadata"] for c in chunks]
+
+    assert [m["section"] for m in meta] == ["front matter", "9 CLEANING", "10 DESCALING"]
+    cleaning = meta[1]
+    assert cleaning["heading"] == "9 CLEANING"
+    assert cleaning["headings"] == ["9 CLEANING", "9 CLEANING > 9.1 Introduction",
+                                    "9 CLEANING > 9.2 Required accessories", "9 CLEANING > 9.3 Weekly cleaning"]
+    assert cleaning["pages"] == [2, 3]
+    # the running header is gone, chunk ids are consecutive
+    assert all("User manual" not in c["text"] for c in chunks)
+    assert [m["chunk_id"] for m in meta] == [0, 1, 2]
+    assert result["chunk_stats"]["boilerplate_lines"] >= 4
+
+
+def test_small_target_keeps_labels_consistent():
+    result = FrankePDFProcessor(target_tokens=8, overlap_tokens=0).chunk_document(sample_manual())
+    assert len(result["chunks"]) > 3
+    for chunk in result["chunks"]:
+        meta = chunk["metadata"]
+        # the heading is what all covered headings share, and never leaves the chapter
+        assert meta["heading"] == common_heading(meta["headings"])
+        assert all(h.startswith(meta["section"]) for h in meta["headings"])
+
+
+def test_page_chunker_still_available():
+    result = FrankePDFProcessor(structure_aware=False).chunk_document(sample_manual())
+    assert [c["metadata"]["source_page"] for c in result["chunks"]] == [1, 2, 3, 4]
+
+
+PROCESSED_DIR = Path(__file__).resolve().parents[1] / "data" / "processed"
+
+
+def shipped(name):
+    with open(PROCESSED_DIR / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_shipped_manual_keeps_numbers_and_headings():
+    doc = shipped("20265720_User manual_A300 FB_en_processed.json")
+    pages, _ = FrankePDFProcessor().prepare_pages(doc)
+    titles = [title for marks in find_headings(pages, doc.get("toc")).values() for *_, title in marks]
+    # a stripped "10.4" used to break the outline check for the rest of the chapter
+    for number in ("10.4", "10.5", "10.6", "10.7", "10.8"):
+        assert any(title.startswith(number + " ") for title in titles), number
+
+    doc = shipped("20109399_User manual_A1000_en_processed.json")
+    raw = {p["page"]: page_lines(p["text"]) for p in doc["text_content"]}
+    pages, _ = FrankePDFProcessor().prepare_pages(doc)
+    for p in pages:
+        # only running headers and page numbers go, part numbers and option lines stay
+        removed = [line for line in raw[p["page"]] if line not in p["lines"]]
+        assert all(any(c.isalpha() for c in line) or line.isdigit() for line in removed), p["page"]
+        assert not any(line.startswith("–") for line in removed), p["page"]
+    assert "560.0003.716" in pages[15]["lines"]
@@ -0,0 +1,101 @@
+from document_structure import (
+    FRONT_MATTER, _numbered_headings, common_heading, dedupe_chunks, find_repeated_lines,
+    split_sections, strip_repeated_lines
+)
+
+
+def page(number, lines, images=()):
+    return {"page": number, "lines": list(lines), "images": list(images)}
+
+
+def manual_pages(count=5):
+    return [page(n, ["User manual A1000", f"Body text {n} about descaling.", "More text.", f"Cleaning | {n}", str(n)])
+            for n in range(1, count + 1)]
+
+
+def test_find_repeated_lines_ignores_numbers():
+    repeated = find_repeated_lines(manual_pages())
+    assert "user manual a#" in repeated
+    assert "cleaning | #" in repeated
+    # a bare page number is handled by is_page_number, not as a repeated line
+    assert "#" not in repeated
+
+
+def test_find_repeated_lines_skips_numbers_and_list_items():
+    # section numbers, part numbers and option lists come back at page edges too
+    pages = [page(n, [f"{n}.{n}", "560.0003.716", "– yes", "chine.", "Body.", "More.", "– no", f"Cleaning | {n}"])
+             for n in range(1, 6)]
+    assert find_repeated_lines(pages) == {"cleaning | #"}
+    kept = strip_repeated_lines(pages[2]["lines"], find_repeated_lines(pages), 3)
+    assert kept == ["3.3", "560.0003.716", "– yes", "chine.", "Body.", "More.", "– no"]
+
+
+def test_find_repeated_lines_needs_min_repeats():
+    pages = manual_pages(2)
+    assert find_repeated_lines(pages, min_repeats=3) == set()
+
+
+def test_strip_repeated_lines_keeps_headings_and_body():
+    pages = manual_pages()
+    repeated = find_repeated_lines(pages)
+    lines = ["User manual A1000", "9", "Cleaning", "Body", "Cleaning | 3", "3"]
+    kept = strip_repeated_lines(lines, repeated | {"cleaning"}, 3, keep={"cleaning"})
+    assert kept == ["9", "Cleaning", "Body"]
+
+
+def test_numbered_headings_follow_the_outline():
+    pages = [
+        page(1, ["9", "CLEANING", "9.1", "Introduction", "Some text.", "9.2 Required cleaning accessories"]),
+        page(2, ["9.3", "5-step method", "Step text.", "16", "Grounds container capacity", "9.4", "Starting the cleaning"]),
+    ]
+    headings = _numbered_headings(pages)
+    titles = [mark[3] for marks in headings.values() for mark in marks]
+    # "16" halfway down a page is a table row, "9.3 5-step method" doesn't break the sequence
+    assert titles == ["9 CLEANING", "9.1 Introduction", "9.2 Required cleaning accessories",
+                      "9.3 5-step method", "9.4 Starting the cleaning"]
+    assert headings[1][0][:3] == (0, 2, 1)
+    assert headings[1][2][:3] == (5, 1, 2)
+
+
+def test_numbered_headings_skip_contents_and_steps():
+    pages = [page(1, ["Contents", "9.1", "Introduction", "45"]),
+             page(2, ["1", "SAFETY", "1.1", "Intended use", "3. Open the door.", "7.5", "out of sequence"])]
+    titles = [mark[3] for marks in _numbered_headings(pages).values() for mark in marks]
+    assert titles == ["1 SAFETY", "1.1 Intended use"]
+
+
+def test_split_sections_labels_front_matter():
+    pages = [page(1, ["Cover", "Legal notice"]), page(2, ["Intro text", "HEAD", "Section text"], images=["img"])]
+    headings = {2: [(1, 1, 1, "1 HEAD")]}
+    sections = split_sections(pages, headings)
+    assert sections[0]["chapter"] == FRONT_MATTER
+    assert sections[0]["heading"] == FRONT_MATTER
+    assert [p["page"] for p in sections[0]["parts"]] == [1, 2]
+    assert sections[1]["chapter"] == "1 HEAD"
+    assert [line for part in sections[1]["parts"] for line in part["lines"]] == ["1 HEAD", "Section text"]
+
+
+def test_split_sections_heading_path():
+    pages = [page(1, ["A", "x", "B", "y", "C", "z"])]
+    headings = {1: [(0, 1, 1, "1 A"), (2, 1, 2, "1.1 B"), (4, 1, 2, "1.2 C")]}
+    sections = split_sections(pages, headings)
+    assert [s["heading"] for s in sections] == ["1 A", "1 A > 1.1 B", "1 A > 1.2 C"]
+    assert {s["chapter"] for s in sections} == {"1 A"}
+
+
+def test_common_heading():
+    assert common_heading(["9 CLEANING > 9.4 Start", "9 CLEANING > 9.5 Aerator"]) == "9 CLEANING"
+    assert common_heading(["9 CLEANING > 9.4 Start"]) == "9 CLEANING > 9.4 Start"
+    assert common_heading(["1 A", "2 B"]) is None
+
+
+def chunk(text, page):
+    return {"text": text, "metadata": {"source_page": page, "pages": [page]}}
+
+
+def test_dedupe_chunks():
+    chunks = [chunk("WARNING: Hot surface 1!", 1), chunk("Descale weekly.", 2), chunk("warning hot surface 7", 9)]
+    kept, dropped = dedupe_chunks(chunks)
+    assert dropped == 1
+    assert [c["text"] for c in kept] == ["WARNING: Hot surface 1!", "Descale weekly."]
+    assert kept[0]["metadata"]["duplicate_pages"] == [9]
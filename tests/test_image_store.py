@@ -0,0 +1,43 @@
+import io
+
+import fitz
+from PIL import Image
+
+from retrieval_backbone.image_store import ImageStore
+
+
+def png(color, size=64):
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(pages, figure_page):
+    doc = fitz.open()
+    logo, figure = png("red"), png("blue")
+    for page_num in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(10, 10, 74, 74), stream=logo)
+        if page_num == figure_page:
+            page.insert_image(fitz.Rect(100, 100, 164, 164), stream=figure)
+    return doc
+
+
+def test_same_image_is_stored_once(tmp_path):
+    store = ImageStore(tmp_path, max_pages=10)
+    page_images, image_info = store.extract_from_document(make_pdf(3, figure_page=2))
+    assert len(image_info) == 2
+    assert len(page_images[2]) == 2
+    assert page_images[1] == page_images[3]
+    image_hash = page_images[1][0]
+    assert store.find(image_hash) is not None
+    assert store.thumb_path(image_hash).exists()
+
+
+def test_repeated_logo_is_not_linked(tmp_path):
+    store = ImageStore(tmp_path, max_pages=5)
+    page_images, image_info = store.extract_from_document(make_pdf(8, figure_page=4))
+    # the logo is on every page: stored, but no page links to it
+    assert len(image_info) == 2
+    assert page_images[1] == []
+    assert len(page_images[4]) == 1
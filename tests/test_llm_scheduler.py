@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agentic_reasoning.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, SchedulerRejected
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrency_limit():
+    scheduler = LLMScheduler(max_concurrency=2, max_queue=10)
+    running = []
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with scheduler.slot():
+            running.append(1)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    run(main())
+    assert peak == 2
+    stats = scheduler.stats()
+    assert stats["completed"] == 6
+    assert stats["active"] == 0
+
+
+def test_interactive_goes_first():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    order = []
+
+    async def call(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    async def main():
+        await scheduler.acquire()   # hold the only slot while the others queue up
+        tasks = [asyncio.create_task(call("batch-1", BATCH)), asyncio.create_task(call("batch-2", BATCH))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("interactive", INTERACTIVE)))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    run(main())
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+
+def test_full_queue_is_rejected():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+
+    async def main():
+        await scheduler.acquire()
+        waiting = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire()
+        assert rejected.value.status == "overloaded"
+        scheduler.release()
+        await waiting
+        scheduler.release()
+
+    run(main())
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_deadline_frees_the_queue_spot():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=5)
+
+    async def main():
+        await scheduler.acquire()
+        with pytest.raises(SchedulerRejected) as rejected:
+            await scheduler.acquire(timeout=0.01)
+        assert rejected.value.status == "deadline"
+        assert scheduler.stats()["queue_depth"] == 0
+        scheduler.release()
+        # the expired waiter didn't keep the slot
+        await asyncio.wait_for(scheduler.acquire(), 1)
+        scheduler.release()
+
+    run(main())
+    assert scheduler.stats()["expired"] == 1
+    assert scheduler.stats()["active"] == 0
@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("pytesseract")
+
+from franke_processor_regex import FrankePDFProcessor
+from ocr_cache import OCRCache
+
+
+class CountingOCR:
+    """render_page / run_ocr stand-ins that count the calls, confidence per DPI"""
+    def __init__(self, confidence):
+        self.confidence = confidence
+        self.renders = []
+        self.ocr_calls = []
+
+    def render_page(self, page, dpi):
+        self.renders.append((page, dpi))
+        return f"{page}@{dpi}".encode()
+
+    def run_ocr(self, img_data):
+        self.ocr_calls.append(img_data)
+        page, dpi = img_data.decode().split("@")
+        return f"text of {page} at {dpi}", self.confidence[int(dpi)]
+
+
+def processor(monkeypatch, cache, confidence, **settings):
+    ocr = CountingOCR(confidence)
+    proc = FrankePDFProcessor(ocr_cache=cache, **settings)
+    monkeypatch.setattr(proc, "render_page", ocr.render_page)
+    monkeypatch.setattr(proc, "run_ocr", ocr.run_ocr)
+    return proc, ocr
+
+
+def test_second_pass_reads_the_cache(monkeypatch, tmp_path):
+    cache = OCRCache(tmp_path)
+    proc, ocr = processor(monkeypatch, cache, {150: 90, 300: 95})
+    assert proc.ocr_page("p1") == "text of p1 at 150"
+    assert len(ocr.ocr_calls) == 1
+
+    # a new processor (e.g. a rechunk run) over the same page never calls Tesseract
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path), {150: 90, 300: 95})
+    assert proc.ocr_page("p1") == "text of p1 at 150"
+    assert ocr.ocr_calls == []
+    assert (proc.ocr_cache.hits, proc.ocr_cache.misses) == (1, 0)
+
+
+def test_changed_settings_miss_the_cache(monkeypatch, tmp_path):
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path), {150: 90, 300: 95})
+    proc.ocr_page("p1")
+
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path), {150: 90, 300: 95}, ocr_lang="deu")
+    proc.ocr_page("p1")
+    assert len(ocr.ocr_calls) == 1
+    assert proc.ocr_cache.misses == 1
+
+
+def test_rerender_only_below_min_confidence(monkeypatch, tmp_path):
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path), {150: 80, 300: 95}, ocr_min_confidence=60)
+    assert proc.ocr_page("p1") == "text of p1 at 150"
+    assert ocr.renders == [("p1", 150)]
+
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path / "low"), {150: 40, 300: 95}, ocr_min_confidence=60)
+    assert proc.ocr_page("p1") == "text of p1 at 300"
+    assert ocr.renders == [("p1", 150), ("p1", 300)]
+    assert len(ocr.ocr_calls) == 2
+
+    # the cached entry holds the high DPI result, keyed by the low DPI render
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path / "low"), {150: 40, 300: 95}, ocr_min_confidence=60)
+    assert proc.ocr_page("p1") == "text of p1 at 300"
+    assert ocr.renders == [("p1", 150)] and ocr.ocr_calls == []
+
+
+def test_corrupt_entry_is_a_miss(monkeypatch, tmp_path):
+    cache = OCRCache(tmp_path)
+    proc, ocr = processor(monkeypatch, cache, {150: 90, 300: 95})
+    proc.ocr_page("p1")
+    [entry] = list(tmp_path.rglob("*.json"))
+    entry.write_text('{"text": "half writ')
+
+    proc, ocr = processor(monkeypatch, OCRCache(tmp_path), {150: 90, 300: 95})
+    assert proc.ocr_page("p1") == "text of p1 at 150"
+    assert len(ocr.ocr_calls) == 1
+    assert (proc.ocr_cache.hits, proc.ocr_cache.misses) == (0, 1)
+    # rewritten, the next pass hits again
+    assert OCRCache(tmp_path).get(proc.ocr_cache.make_key(b"p1@150", proc.ocr_settings()))["text"] == "text of p1 at 150"
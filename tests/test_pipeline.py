@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from agentic_reasoning import multi_agent_pipeline as pipeline
+from agentic_reasoning.session_memory import SessionStore
+from conftest import make_doc
+
+
+def result(manual, i):
+    return {"text": f"{manual} chunk {i}", "metadata": {"manual": manual, "source_page": i}, "index": i, "score": 1.0}
+
+
+def test_comparison_needs_two_named_manuals():
+    plan = pipeline.planner_agent({"question": "What is the difference between descaling and rinsing?"})
+    assert plan["sub_queries"] == []
+    assert "comparison" not in plan["plan"]
+
+    plan = pipeline.planner_agent({"question": "Compare the cleaning of the A300 and A1000"})
+    assert [sq["manual"] for sq in plan["sub_queries"]] == ["A1000", "A300"]
+
+
+@pytest.mark.parametrize("manuals", [2, 3, 4])
+def test_join_context_stays_within_cap(manuals):
+    names = ["A1000", "A300", "A600", "S700"][:manuals]
+    state = {"question": "q", "manual_results": [
+        {"manual": name, "results": [result(name, i) for i in range(4)]} for name in names
+    ]}
+    joined = pipeline.join_context_agent(state)
+    assert len(joined["sources"]) <= pipeline.MAX_CONTEXT_CHUNKS
+    # every manual still gets its share
+    assert {s["manual"] for s in joined["sources"]} == set(names)
+
+
+@pytest.fixture
+def session_store(monkeypatch):
+    store = SessionStore()
+    monkeypatch.setattr(pipeline, "sessions", store)
+    return store
+
+
+def two_manual_db(make_db):
+    docs = [make_doc(f"descale the boiler step {i}", "A1000", i + 1) for i in range(6)]
+    docs += [make_doc(f"descale the boiler A300 step {i}", "A300", i + 1) for i in range(6)]
+    return make_db(docs)
+
+
+def remember_a1000_turn(db, store, question):
+    session = store.get_or_create()
+    a1000_ids = [i for i, doc in enumerate(db.documents) if doc["metadata"]["manual"] == "A1000"][:3]
+    # same embedding as the follow-up, so only the manuals can tell the turns apart
+    store.update(session, lambda s: s.remember_retrieval(question, db.embed(question), a1000_ids, ["A1000"], db.version))
+    return session
+
+
+def run_turn(db, session, question):
+    # planner + single retriever, the way the graph runs a non-comparison question
+    state = {"question": question, "session_id": session.session_id}
+    state.update(pipeline.planner_agent(state))
+    if not state["sub_queries"]:
+        pipeline.retrieve_with_session(db, state, question, state["manuals_mentioned"])
+    return state
+
+
+def test_planner_with_session_counts_only_named_manuals(make_db, session_store):
+    db = two_manual_db(make_db)
+    session = session_store.get_or_create()
+
+    # no manual named: all of them are searched, none is remembered
+    state = run_turn(db, session, "How do I descale the boiler?")
+    assert state["manuals_mentioned"] == ["A1000", "A300", "A600", "S700"]
+    assert session.manuals == []
+    state = run_turn(db, session, "What's the difference between descaling and rinsing?")
+    assert state["sub_queries"] == []
+
+    # a named manual carries over, "compare that with" adds the new one
+    run_turn(db, session, "How do I descale the A1000?")
+    assert session.manuals == ["A1000"]
+    state = run_turn(db, session, "And how often?")
+    assert state["manuals_named"] == ["A1000"] and state["sub_queries"] == []
+    state = run_turn(db, session, "Compare that with the A300")
+    assert [sq["manual"] for sq in state["sub_queries"]] == ["A1000", "A300"]
+    # naming another manual without comparing switches to it
+    state = run_turn(db, session, "How do I descale the A300?")
+    assert state["manuals_named"] == ["A300"]
+
+
+def test_other_manual_is_not_answered_from_cached_chunks(make_db, session_store):
+    db = two_manual_db(make_db)
+    question = "how do I descale the boiler"
+    session = remember_a1000_turn(db, session_store, question)
+
+    results, decision = pipeline.retrieve_with_session(db, {"session_id": session.session_id}, question, ["A300"])
+    assert decision == "new"
+    assert results
+    assert all(r["metadata"]["manual"] == "A300" for r in results)
+    assert session.manuals == ["A300"]
+
+
+def test_same_manual_reuses_context(make_db, session_store):
+    db = two_manual_db(make_db)
+    question = "how do I descale the boiler"
+    session = remember_a1000_turn(db, session_store, question)
+    cached = list(session.chunk_ids)
+
+    results, decision = pipeline.retrieve_with_session(db, {"session_id": session.session_id}, question, ["A1000"])
+    assert decision == "reuse"
+    assert [r["index"] for r in results] == cached
+
+
+def test_decide_context_reuse_checks_manuals(session_store):
+    session = session_store.get_or_create()
+    embedding = np.ones(4, dtype="float32") / 2
+    session_store.update(session, lambda s: s.remember_retrieval("q", embedding, [1], ["A1000"], "v1"))
+    assert pipeline.decide_context_reuse(session, "q", embedding, "v1", ["A1000"])[0] == "reuse"
+    assert pipeline.decide_context_reuse(session, "q", embedding, "v1", ["A300"])[0] == "new"
+    assert pipeline.decide_context_reuse(session, "q", embedding, "v2", ["A1000"])[0] == "new"
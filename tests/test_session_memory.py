@@ -0,0 +1,65 @@
+import numpy as np
+
+from agentic_reasoning.session_memory import SessionStore
+
+
+def test_get_or_create_keeps_id():
+    store = SessionStore()
+    session = store.get_or_create()
+    assert store.get_or_create(session.session_id) is session
+    assert store.get(session.session_id) is session
+    assert store.get(None) is None
+
+
+def test_unknown_id_starts_a_session_with_it():
+    store = SessionStore()
+    assert store.get_or_create("abc").session_id == "abc"
+
+
+def test_lru_eviction():
+    store = SessionStore(max_sessions=2)
+    a, b = store.get_or_create(), store.get_or_create()
+    store.get(a.session_id)          # a is now the most recently used
+    store.get_or_create()
+    assert store.get(b.session_id) is None
+    assert store.get(a.session_id) is a
+    assert store.stats()["evicted"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    store = SessionStore(ttl_seconds=10)
+    session = store.get_or_create()
+    session.last_used -= 11
+    assert store.get(session.session_id) is None
+    assert store.stats()["expired"] == 1
+
+
+def test_memory_cap_and_accounting():
+    store = SessionStore(max_bytes=3000)
+    first = store.get_or_create()
+    store.update(first, lambda s: s.add_turn("q", "x" * 2000))
+    assert store.stats()["memory_bytes"] >= 2000
+
+    second = store.get_or_create()
+    store.update(second, lambda s: s.add_turn("q", "y" * 2000))
+    # over the cap, the least recently used session goes
+    assert store.get(first.session_id) is None
+    assert store.stats()["memory_bytes"] < 3000
+
+
+def test_turns_are_capped():
+    store = SessionStore(max_turns=2)
+    session = store.get_or_create()
+    for i in range(5):
+        store.update(session, lambda s, i=i: s.add_turn(f"q{i}", "a"))
+    assert [t["question"] for t in session.turns] == ["q3", "q4"]
+
+
+def test_remember_retrieval():
+    store = SessionStore()
+    session = store.get_or_create()
+    embedding = np.ones(4, dtype="float32")
+    store.update(session, lambda s: s.remember_retrieval("q", embedding, [3, 1], ["A1000"], "v1"))
+    assert session.chunk_ids == [3, 1]
+    assert session.manuals == ["A1000"]
+    assert session.store_version == "v1"
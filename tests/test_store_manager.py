@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from conftest import make_doc
+from retrieval_backbone.VectorDB import VectorDB
+from retrieval_backbone.store_manager import StoreManager
+
+
+def save_store(make_db, save_dir, texts):
+    db = make_db([make_doc(text, "A1000", i + 1) for i, text in enumerate(texts)])
+    db.save(save_dir=str(save_dir), keep_snapshots=2)
+    return db
+
+
+def test_save_publishes_snapshots(make_db, embedder, tmp_path):
+    first = save_store(make_db, tmp_path, ["descale", "rinse"])
+    assert VectorDB.current_version(str(tmp_path)) == first.version
+
+    loaded = VectorDB.load(save_dir=str(tmp_path), model=embedder)
+    assert loaded.version == first.version
+    assert [d["text"] for d in loaded.documents] == ["descale", "rinse"]
+
+    for texts in (["a"], ["b"], ["c"]):
+        latest = save_store(make_db, tmp_path, texts)
+    # the older snapshots are pruned, CURRENT names the newest
+    assert len(list((tmp_path / "snapshots").iterdir())) == 2
+    assert VectorDB.current_version(str(tmp_path)) == latest.version
+
+
+def test_reload_waits_for_in_flight_searches(make_db, embedder, tmp_path):
+    save_store(make_db, tmp_path, ["descale", "rinse"])
+    manager = StoreManager(str(tmp_path), lambda d, prev: VectorDB.load(save_dir=d, model=embedder),
+                           VectorDB.current_version, poll_interval=0)
+    assert manager.check_for_update()   # first load
+    assert not manager.check_for_update()
+
+    with manager.acquire() as old_db:
+        save_store(make_db, tmp_path, ["milk", "grinder", "boiler"])
+        assert manager.check_for_update()
+        # the search that started on the old snapshot still has it
+        assert len(old_db.documents) == 2
+        assert manager.stats()["reloads"] == 2
+
+    with manager.acquire() as new_db:
+        assert len(new_db.documents) == 3
+    assert manager.stats()["in_flight"] == 0
+
+
+def test_failed_reload_keeps_old_store(make_db, embedder, tmp_path):
+    save_store(make_db, tmp_path, ["descale"])
+    calls = []
+
+    def load(save_dir, previous):
+        calls.append(save_dir)
+        if len(calls) > 1:
+            raise OSError("half copied")
+        return VectorDB.load(save_dir=save_dir, model=embedder)
+
+    manager = StoreManager(str(tmp_path), load, VectorDB.current_version, poll_interval=0)
+    version = manager.current().version
+    save_store(make_db, tmp_path, ["rinse"])
+    assert not manager.check_for_update()
+    assert manager.version == version
+    assert manager.stats()["reload_errors"] == 1
+
+
+def test_ingestion_publishes_where_the_api_watches():
+    pytest.importorskip("pytesseract")
+    import franke_processor_regex_multi as ingestion
+    from agentic_reasoning import multi_agent_pipeline as pipeline
+
+    assert Path(ingestion.save_dir) == pipeline.FAISS_DIR
+    assert pipeline.store.save_dir == str(pipeline.FAISS_DIR)
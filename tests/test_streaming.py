@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from streaming import StreamStats, coalesce
+
+
+async def tokens(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def collect(stream):
+    async def run():
+        return [batch async for batch in stream]
+    return asyncio.run(run())
+
+
+def test_coalesce_by_bytes():
+    batches = collect(coalesce(tokens(["ab", "cd", "ef", "g"]), flush_interval_ms=0, flush_bytes=4))
+    assert batches == ["abcd", "efg"]
+
+
+def test_coalesce_flushes_on_time():
+    # the batch is sent after the window even though the byte limit is never reached
+    batches = collect(coalesce(tokens(["a", "b", "c"], delay=0.03), flush_interval_ms=10, flush_bytes=1000))
+    assert "".join(batches) == "abc"
+    assert len(batches) == 3
+
+
+def test_coalesce_off_passes_tokens_through():
+    assert collect(coalesce(tokens(["a", "b"]), flush_interval_ms=0, flush_bytes=0)) == ["a", "b"]
+
+
+def test_coalesce_reraises_after_flushing():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("llm went away")
+
+    async def run():
+        seen = []
+        with pytest.raises(RuntimeError):
+            async for batch in coalesce(failing(), flush_interval_ms=1000, flush_bytes=1000):
+                seen.append(batch)
+        return seen
+
+    assert asyncio.run(run()) == ["partial"]
+
+
+def test_stream_stats():
+    stats = StreamStats()
+    streams = StreamStats.totals["streams"]
+    stats.chunks = 3
+    stats.record("héllo")
+    result = stats.finish()
+    assert result["frames"] == 1
+    assert result["bytes"] == 6
+    assert result["llm_chunks"] == 3
+    assert "cpu_ms" not in result
+    assert StreamStats.totals["streams"] == streams + 1
+    assert "process_cpu_seconds" in StreamStats.summary()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+
+import traffic
+from traffic import TrafficRecorder, load_records, replay, scrub
+
+
+def test_scrub_masks_personal_data():
+    question = "Mail max@example.com or call +49 170 1234567, see https://franke.com/x order 123456"
+    assert scrub(question) == "Mail <email> or call <phone>, see <url> order <number>"
+    # model names stay
+    assert scrub("A1000 vs S700") == "A1000 vs S700"
+
+
+def test_scrub_accepts_any_type():
+    assert scrub(None) == ""
+    assert scrub(1234) == "1234"
+    assert scrub(["descale"]) == "['descale']"
+
+
+def wait_recorded(recorder, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while recorder.recorded < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert recorder.recorded == count
+
+
+def test_recorder_writes_scrubbed_lines(tmp_path):
+    path = tmp_path / "traffic" / "traffic.jsonl"
+    recorder = TrafficRecorder(path)
+    started = time.time()
+    recorder.record("ask", "mail me at max@example.com", "session-1", started, "ok", ttft=0.25)
+    recorder.record("stream", None, "session-1", started, "error")
+    recorder.record("stream", {"question": "x"}, None, started, "error")
+    wait_recorded(recorder, 3)
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["q"] for line in lines] == ["mail me at <email>", "", "{'question': 'x'}"]
+    assert lines[0]["s"] == lines[1]["s"] != "session-1"
+    assert lines[2]["s"] is None
+    assert lines[0]["ttft"] == 250.0
+    # questions that ended up empty are not replayed
+    assert [r["ep"] for r in load_records(path)] == ["ask", "stream"]
+
+
+def test_replay_keeps_record_order(monkeypatch):
+    # the first request is the slowest, its answer comes back last
+    delays = {"first": 0.05, "second": 0.02, "third": 0.0}
+
+    async def fake_ask(client, url, record, session_id):
+        await asyncio.sleep(delays[record["q"]])
+        return "ok", delays[record["q"]], None, session_id
+
+    monkeypatch.setattr(traffic, "replay_ask", fake_ask)
+    records = [{"ts": 100.0, "ep": "ask", "s": f"s{i}", "q": q, "ms": i} for i, q in enumerate(delays)]
+    results, _ = asyncio.run(replay(records, "http://127.0.0.1:1", speed=1000))
+    assert [r["recorded_ms"] for r in results] == [0, 1, 2]
+    assert all(r["status"] == "ok" for r in results)
+
+
+class FakeResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeClient:
+    def __init__(self, response, delay=0.01):
+        self.response = response
+        self.delay = delay
+
+    async def post(self, url, json=None):
+        await asyncio.sleep(self.delay)
+        return self.response
+
+
+def ask(response):
+    return asyncio.run(traffic.replay_ask(FakeClient(response), "http://x", {"q": "descale?"}, "s1"))
+
+
+def test_replay_ask_reports_server_errors():
+    # FastAPI answers an unhandled exception with plain text, that is a server error, not a client one
+    status, latency, _, session_id = ask(FakeResponse(500, "Internal Server Error"))
+    assert status == "http_500" and latency >= 0.01 and session_id == "s1"
+
+    status, _, _, _ = ask(FakeResponse(503, '{"error": "queue_full", "session_id": "s1"}'))
+    assert status == "queue_full"
+    status, _, _, session_id = ask(FakeResponse(200, '{"answer": "a", "session_id": "s2"}'))
+    assert (status, session_id) == ("ok", "s2")
+    status, _, _, _ = ask(FakeResponse(200, "<html>"))
+    assert status == "invalid_response"
@@ -0,0 +1,76 @@
+import numpy as np
+
+from conftest import make_doc
+
+
+def lopsided_docs():
+    # the A1000 manual matches "milk system cleaning" much better than the A300 one
+    docs = [make_doc(f"milk system cleaning part{i}", "A1000", i // 2 + 1) for i in range(20)]
+    docs += [make_doc("A300 milk tablet", "A300", 1), make_doc("A300 descaling the boiler", "A300", 2)]
+    return docs
+
+
+def test_manual_filter_keeps_weaker_manual(make_db):
+    db = make_db(lopsided_docs())
+    unfiltered = db.search("milk system cleaning", k=5, threshold=0.0)
+    assert {r["metadata"]["manual"] for r in unfiltered} == {"A1000"}
+
+    results = db.search("milk system cleaning", k=5, threshold=0.0, manuals=["A300"])
+    assert results
+    assert {r["metadata"]["manual"] for r in results} == {"A300"}
+
+
+def test_unknown_manual_returns_nothing(make_db):
+    db = make_db(lopsided_docs())
+    assert db.search("milk", k=3, threshold=0.0, manuals=["S700"]) == []
+
+
+def test_manual_filter_hierarchical(make_db):
+    db = make_db(lopsided_docs())
+    # one section: without the manual restriction in stage 1 it would be an A1000 section
+    results = db.search("milk system cleaning", k=2, threshold=0.0, hierarchical=True, top_sections=1, manuals=["A300"])
+    assert results
+    assert all(r["metadata"]["manual"] == "A300" for r in results)
+
+
+def test_hierarchical_search_stats_per_call(make_db):
+    db = make_db(lopsided_docs())
+    flat, hierarchical = {}, {}
+    db.search("milk system cleaning", k=3, threshold=0.0, stats=flat)
+    db.search("milk system cleaning", k=3, threshold=0.0, hierarchical=True, stats=hierarchical)
+    assert flat == {"mode": "flat", "vectors_scored": 22}
+    assert hierarchical["mode"] == "hierarchical"
+    assert hierarchical["vectors_scored"] < 22
+    assert not hasattr(db, "last_search_stats")
+
+
+def test_hierarchical_caps_chunks_per_page(make_db):
+    db = make_db(lopsided_docs())
+    results = db.search("milk system cleaning", k=6, threshold=0.0, hierarchical=True, top_sections=3, max_per_page=1)
+    pages = [db.page_key(r) for r in results]
+    assert len(pages) == len(set(pages))
+
+
+def test_chunk_vectors_are_a_view(make_db):
+    db = make_db(lopsided_docs())
+    db.build_hierarchy()
+    assert not db.chunk_vectors.flags.owndata
+    assert np.array_equal(db.chunk_vectors, db.index.reconstruct_n(0, db.index.ntotal))
+
+    # adding documents moves the storage, the view is dropped and rebuilt
+    db.add_documents([make_doc("A600 grinder", "A600", 1)])
+    assert db.chunk_vectors is None
+    db.build_hierarchy()
+    assert db.chunk_vectors.shape[0] == 23
+
+
+def test_section_index_survives_save_and_load(make_db, embedder, tmp_path):
+    from retrieval_backbone.VectorDB import VectorDB
+
+    db = make_db(lopsided_docs())
+    db.save(save_dir=str(tmp_path))
+    loaded = VectorDB.load(save_dir=str(tmp_path), model=embedder)
+    assert loaded.section_index.ntotal == db.section_index.ntotal
+    assert not loaded.chunk_vectors.flags.owndata
+    expected = db.search("milk system cleaning", k=3, threshold=0.0, hierarchical=True)
+    assert loaded.search("milk system cleaning", k=3, threshold=0.0, hierarchical=True) == expected
@@ -0,0 +1,304 @@
+"""
+Traffic capture and replay for load tests.
+
+TrafficRecorder (used by main.py when TRAFFIC_RECORD_FILE is set) appends one JSON line per
+/ask or /stream request:
+    {"ts": 1760000000.123, "ep": "stream", "s": "3f9a1c0b7d2e", "q": "How do I descale it?",
+     "plan": {"manuals": ["A1000"], "sub_queries": 0, "comparison": false}, "ret": "extend", "status": "ok",
+     "ms": 1840.2, "ttft": 410.7}
+ts is when the request arrived, s a salted hash of the session id (follow-ups stay together,
+the id itself is not stored) and e-mail addresses, URLs, phone and other long numbers are
+masked in the question. Nothing about the client (IP, headers) is recorded. The file is
+written by a background thread, when it can't keep up records are dropped, requests never wait.
+
+The replay driver sends a recorded file to a running server with the recorded timing, or N
+times faster, and reports throughput, time to first token, latency percentiles and errors.
+Requests of the same session are sent one after another like the user did. Start the server
+with LLM_BACKEND = "mock" to load test the API without LLM costs.
+
+usage: python traffic.py traffic.jsonl [--url http://127.0.0.1:8000] [--speed 2] [--limit 500]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import statistics
+import threading
+import time
+from pathlib import Path
+
+
+# masked in recorded questions, the model names (A1000, S700...) are kept
+SCRUB_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+|www\.\S+"), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<phone>"),
+    (re.compile(r"\b\d{5,}\b"), "<number>"),
+]
+
+
+def scrub(text):
+    # the question comes from client JSON, it isn't necessarily a string
+    if not isinstance(text, str):
+        text = "" if text is None else str(text)
+    for pattern, replacement in SCRUB_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def summarize_plan(state):
+    """The planner decisions worth keeping from a pipeline state / planner output"""
+    return {
+        "manuals": state.get("manuals_mentioned", []),
+        "sub_queries": len(state.get("sub_queries") or []),
+        "comparison": "comparison" in state.get("plan", ""),
+    }
+
+
+class TrafficRecorder:
+    def __init__(self, path, sample_rate=1.0, max_queue=10000):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue)
+        # per process, so the hashes can't be matched against session ids from elsewhere
+        self._salt = os.urandom(16)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def sample(self):
+        """Decide at the start of a request whether it gets recorded"""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def anonymize_session(self, session_id):
+        if not session_id:
+            return None
+        return hashlib.sha256(self._salt + session_id.encode("utf-8")).hexdigest()[:12]
+
+    def record(self, endpoint, question, session_id, started, status, plan=None, retrieval=None, ttft=None):
+        entry = {
+            "ts": round(started, 3),
+            "ep": endpoint,
+            "s": self.anonymize_session(session_id),
+            "q": scrub(question),
+            "plan": plan,
+            "ret": retrieval,
+            "status": status,
+            "ms": round((time.time() - started) * 1000, 1),
+        }
+        if ttft is not None:
+            entry["ttft"] = round(ttft * 1000, 1)
+
+        self._start_writer()
+        try:
+            self._queue.put_nowait(json.dumps(entry, ensure_ascii=False, separators=(",", ":")))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # O_APPEND + one write per batch of whole lines, several workers can share the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            lines = [self._queue.get()]
+            while len(lines) < 500:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+            self.recorded += len(lines)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "file": str(self.path),
+            "sample_rate": self.sample_rate,
+            "recorded": self.recorded,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+        }
+
+
+# --- replay ---
+
+def load_records(path, limit=None, endpoints=("ask", "stream")):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a partly written last line
+            if record.get("ep") in endpoints and record.get("q"):
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+async def replay_ask(client, url, record, session_id):
+    start = time.perf_counter()
+    response = await client.post(f"{url}/ask", json={"question": record["q"], "session_id": session_id})
+    latency = time.perf_counter() - start
+    try:
+        body = response.json()
+    except ValueError:
+        # an unhandled server error comes back as plain text "Internal Server Error"
+        body = None
+    if response.status_code == 200:
+        if not isinstance(body, dict):
+            return "invalid_response", latency, None, session_id
+        return "ok", latency, None, body.get("session_id", session_id)
+    error = body.get("error") if isinstance(body, dict) else None
+    return error or f"http_{response.status_code}", latency, None, session_id
+
+
+async def replay_stream(url, record, session_id):
+    import websockets
+
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://") + "/stream"
+    start = time.perf_counter()
+    ttft = None
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        await ws.send(json.dumps({"question": record["q"], "session_id": session_id}))
+        async for message in ws:
+            frame = json.loads(message)
+            if frame["type"] == "tokens" and ttft is None:
+                ttft = time.perf_counter() - start
+            elif frame["type"] == "done":
+                return "ok", time.perf_counter() - start, ttft, frame.get("session_id", session_id)
+            elif frame["type"] == "error":
+                return frame.get("status", "error"), time.perf_counter() - start, ttft, session_id
+    return "disconnected", time.perf_counter() - start, ttft, session_id
+
+
+async def replay(records, url, speed=1.0, timeout=120.0):
+    """
+    Re-issue the records with their recorded spacing divided by speed, returns one result per
+    record in the order of records (not in the order the answers came back)
+    """
+    import httpx
+
+    results = [None] * len(records)
+    session_ids = {}     # recorded session hash -> session id the server gave us
+    session_tails = {}   # recorded session hash -> task of its latest request
+    first_ts = records[0]["ts"]
+    start = time.perf_counter()
+
+    async def one(i, record, previous):
+        # a user sends the follow-up after the answer arrived, keep that order
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        planned = (record["ts"] - first_ts) / speed
+        lag = time.perf_counter() - start - planned
+        session = record.get("s")
+        sent = time.perf_counter()
+        try:
+            if record["ep"] == "ask":
+                status, latency, ttft, new_id = await asyncio.wait_for(
+                    replay_ask(client, url, record, session_ids.get(session)), timeout)
+            else:
+                status, latency, ttft, new_id = await asyncio.wait_for(
+                    replay_stream(url, record, session_ids.get(session)), timeout)
+            if session:
+                session_ids[session] = new_id
+        except asyncio.TimeoutError:
+            status, latency, ttft = "timeout", timeout, None
+        except Exception as e:
+            status, latency, ttft = f"client_error:{type(e).__name__}", time.perf_counter() - sent, None
+        results[i] = {
+            "ep": record["ep"], "status": status, "latency": latency, "ttft": ttft,
+            "lag": max(lag, 0.0), "recorded_ms": record.get("ms"), "recorded_ttft": record.get("ttft"),
+        }
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        tasks = []
+        for i, record in enumerate(records):
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            session = record.get("s")
+            task = asyncio.create_task(one(i, record, session_tails.get(session) if session else None))
+            if session:
+                session_tails[session] = task
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
+    return results, time.perf_counter() - start
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(results, total):
+    print(f"\n{len(results)} requests in {total:.1f}s, throughput {len(results) / total:.2f} req/s")
+    for endpoint in ("ask", "stream"):
+        rows = [r for r in results if r["ep"] == endpoint]
+        if not rows:
+            continue
+        ok = [r for r in rows if r["status"] == "ok"]
+        errors = {}
+        for r in rows:
+            if r["status"] != "ok":
+                errors[r["status"]] = errors.get(r["status"], 0) + 1
+
+        latencies = [r["latency"] * 1000 for r in ok]
+        print(f"\n/{endpoint}: {len(rows)} requests, {len(ok)} ok, error rate {(1 - len(ok) / len(rows)) * 100:.1f}%"
+              + (f" {errors}" if errors else ""))
+        if latencies:
+            print(f"  latency  p50 {percentile(latencies, 0.5):7.0f} ms  p95 {percentile(latencies, 0.95):7.0f} ms"
+                  f"  p99 {percentile(latencies, 0.99):7.0f} ms  max {max(latencies):7.0f} ms")
+        ttfts = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+        if ttfts:
+            print(f"  ttft     p50 {percentile(ttfts, 0.5):7.0f} ms  p95 {percentile(ttfts, 0.95):7.0f} ms"
+                  f"  p99 {percentile(ttfts, 0.99):7.0f} ms")
+        recorded = [r["recorded_ms"] for r in rows if r["recorded_ms"] is not None]
+        if recorded:
+            print(f"  recorded p50 {percentile(recorded, 0.5):7.0f} ms  p95 {percentile(recorded, 0.95):7.0f} ms"
+                  f"  p99 {percentile(recorded, 0.99):7.0f} ms  (when captured)")
+
+    lags = [r["lag"] * 1000 for r in results]
+    print(f"\nsend lag vs schedule: p50 {statistics.median(lags):.0f} ms, max {max(lags):.0f} ms"
+          " (high values: follow-ups waiting on slow answers, or the client can't keep up)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded /ask and /stream traffic against a server")
+    parser.add_argument("file", help="JSONL file written by the traffic recorder")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="2 = twice as fast as recorded")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    parser.add_argument("--only", choices=["ask", "stream"], default=None)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per request (s)")
+    args = parser.parse_args()
+
+    records = load_records(args.file, args.limit, (args.only,) if args.only else ("ask", "stream"))
+    if not records:
+        print("No requests to replay.")
+        return
+    span = (records[-1]["ts"] - records[0]["ts"]) / args.speed
+    print(f"Replaying {len(records)} requests over ~{span:.0f}s at {args.speed}x against {args.url}")
+    results, total = asyncio.run(replay(records, args.url.rstrip("/"), args.speed, args.timeout))
+    report(results, total)
+
+
+if __name__ == "__main__":
+    main()